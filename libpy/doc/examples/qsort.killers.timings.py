@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+###
+#
+# Times Quicksort on inputs that are hard on quicksorts, and counts the comparisons it makes.
+# The nastiest is built on the fly by M. D. McIlroy's adversary ("A Killer Adversary for
+# Quicksort", Softw. Pract. Exper. 29 (1999)), which decides the outcome of each comparison so as
+# to make the partition values as bad as possible for the sort being attacked.  Argument: n.
+
+from qsort import Quicksort
+from random import randint, seed
+import sys
+from time import time
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 100*1000
+
+def adversary(n):
+   gas = n
+   value = [gas]*n # "gas" means not yet decided
+   solid = 0
+   candidate = 0
+   def freeze(x):
+      nonlocal solid
+      value[x] = solid
+      solid += 1
+   def cmp(x, y):
+      nonlocal candidate
+      if value[x] == gas and value[y] == gas:
+         freeze(x if x == candidate else y)
+      if value[x] == gas: candidate = x
+      elif value[y] == gas: candidate = y
+      return value[x] - value[y]
+   Quicksort(list(range(0, n)), cmp=cmp)
+   return value
+
+def organpipe(n):
+   return list(range(0, n//2)) + list(range(n - n//2 - 1, -1, -1))
+
+seed(31416)
+families = [
+   ("random", [randint(0, n) for k in range(0, n)]),
+   ("sorted", list(range(0, n))),
+   ("reversed", list(range(n, 0, -1))),
+   ("organ pipe", organpipe(n)),
+   ("sawtooth", [k % 1000 for k in range(0, n)]),
+   ("all equal", [7]*n),
+   ("adversary", adversary(n))
+]
+print("Sorting {} entries: seconds, comparisons, and comparisons/(n log2 n)".format(n))
+for name, data in families:
+   count = 0
+   def counting_cmp(x, y):
+      global count
+      count += 1
+      return 1 if x > y else (-1 if x < y else 0)
+   start = time()
+   Quicksort(list(data), cmp=counting_cmp)
+   elapsed = time() - start
+   ratio = count/(n*max(n, 2).bit_length())
+   print("   {:12s} {:8.3f}s {:12d} {:6.2f}".format(name, elapsed, count, ratio))
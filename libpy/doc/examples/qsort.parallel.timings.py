@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+###
+#
+# Times parallel_sort on random floats with from 1 to N worker processes, for lists with each of
+# the two kernels and for a numpy array (which goes through shared memory).  Arguments: the number
+# of entries (default one million) and N (default: the number of cores).
+
+import numpy as np
+import os
+from qsort import parallel_sort
+from random import random, seed
+import sys
+from time import time
+
+def timed(data, workers, kernel):
+   start = time()
+   parallel_sort(data, workers=workers, kernel=kernel)
+   return time() - start
+
+if __name__ == "__main__":
+   n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000*1000
+   N = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+   seed(31416)
+   data = [random() for k in range(0, n)]
+   print("Sorting {} random floats: seconds (speedup over 1 worker)".format(n))
+   print("   {:>7s} {:>18s} {:>18s} {:>18s}".format("workers", "list, quicksort",
+      "list, builtin", "ndarray, builtin"))
+   base = None
+   for workers in sorted(set([1, 2, 4, 8, 16, 32, N])):
+      if workers > N: break
+      times = [timed(list(data), workers, "quicksort"), timed(list(data), workers, "builtin"),
+         timed(np.array(data), workers, "builtin")]
+      base = base or times
+      print("   {:7d} ".format(workers) +
+         " ".join("{:9.3f} ({:5.2f}x)".format(t, b/t) for t, b in zip(times, base)))
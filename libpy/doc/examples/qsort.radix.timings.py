@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+###
+#
+# Times counting_sort, radix_sort, Quicksort (which picks one of those two on its own for int keys)
+# and sorted on random int keys of several ranges, and Quicksort forced to compare (by supplying a
+# cmp).  Then does the same for records with a fixed-width string code as the key.  Argument: the
+# number of keys (default ten million, which takes a while).
+
+from qsort import Quicksort, counting_sort, radix_sort
+from random import choice, randrange, seed
+import sys
+from time import time
+
+def timed(sort, data):
+   start = time()
+   sort(data)
+   return time() - start
+
+def native(x, y):
+   return 1 if x > y else (-1 if x < y else 0)
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 10*1000*1000
+seed(31416)
+print("Sorting {} int keys (seconds):".format(n))
+print("   {:>12s} {:>9s} {:>9s} {:>9s} {:>9s} {:>9s}".format(
+   "range", "counting", "radix", "Quicksort", "with cmp", "sorted"))
+for span in (1000, n, 2**32):
+   data = [randrange(0, span) for k in range(0, n)]
+   counting = timed(counting_sort, list(data)) if span <= 4*n else float("nan")
+   print("   {:12d} {:9.3f} {:9.3f} {:9.3f} {:9.3f} {:9.3f}".format(span, counting,
+      timed(radix_sort, list(data)), timed(Quicksort, list(data)),
+      timed(lambda a: Quicksort(a, cmp=native), list(data)), timed(sorted, data)))
+
+letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+records = [("".join(choice(letters) for k in range(0, 4)), k) for k in range(0, n//10)]
+code = lambda record: record[0]
+print("Sorting {} records by a 4 letter code (seconds):".format(n//10))
+print("   radix_sort      {:8.3f}".format(timed(lambda a: radix_sort(a, key=code), list(records))))
+print("   Quicksort, key  {:8.3f}".format(timed(lambda a: Quicksort(a, key=code), list(records))))
+print("   sorted, key     {:8.3f}".format(timed(lambda a: sorted(a, key=code), records)))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+# Checks the qsort module's sorts and selections against Python's own sorted().  Each check prints
+# "ok" or "FAILED"; the script exits with an error if any failed.
+
+import os
+import random
+import sys
+import tempfile
+from qsort import *
+
+failures = []
+def check(what, ok):
+   print("   {}: {}".format(what, "ok" if ok else "FAILED"))
+   if not ok: failures.append(what)
+
+random.seed(1234)
+ints = [random.randint(-1000, 1000) for n in range(2000)]
+floats = [random.random() for n in range(2000)]
+words = ["".join(random.choice("abcde") for k in range(random.randint(0, 6))) for n in range(2000)]
+reverse = lambda x, y: (y > x) - (y < x)
+
+print("Quicksort:")
+for name, data in (("ints", ints), ("floats", floats), ("words", words)):
+   check(name, Quicksort(list(data)) == sorted(data))
+   check(name+", cmp", Quicksort(list(data), cmp=reverse) == sorted(data, reverse=True))
+   check(name+", key", Quicksort(list(data), key=lambda x: -len(str(x))) ==
+      sorted(data, key=lambda x: -len(str(x))))
+
+print("Selection:")
+for name, data in (("ints", ints), ("floats", floats), ("words", words)):
+   ordered = sorted(data)
+   for k in (0, 1, 999, len(data)-1):
+      a = list(data)
+      ok = select(a, k) == ordered[k] and sorted(a) == ordered
+      ok = ok and all(x <= a[k] for x in a[:k]) and all(x >= a[k] for x in a[k+1:])
+      check("{}: select(a, {})".format(name, k), ok)
+      check("{}: nth_element(a, {})".format(name, k), nth_element(list(data), k)[k] == ordered[k])
+   for k in (0, 1, 10, len(data)):
+      check("{}: partial_sort(a, {})".format(name, k), partial_sort(list(data), k)[:k] == ordered[:k])
+      check("{}: topk(a, {})".format(name, k), topk(data, k) == ordered[::-1][:k])
+      check("{}: topk(a, {}, largest=False)".format(name, k), topk(data, k, largest=False) == ordered[:k])
+a = list(ints)
+check("select in a slice", select(a, 500, start=100, stop=900) == sorted(ints[100:900])[400] and
+   a[:100] == ints[:100] and a[900:] == ints[900:])
+
+print("Counting and radix sorts:")
+check("counting_sort, ints", counting_sort(list(ints)) == sorted(ints))
+check("radix_sort, ints", radix_sort(list(ints)) == sorted(ints))
+big = [random.randrange(-2**70, 2**70) for n in range(2000)]
+check("radix_sort, huge ints", radix_sort(list(big)) == sorted(big))
+check("radix_sort, words", radix_sort(list(words)) == sorted(words))
+pairs = [(x, n) for n, x in enumerate(ints)]
+check("counting_sort, key", counting_sort(list(pairs), key=lambda p: p[0]) ==
+   sorted(pairs, key=lambda p: p[0]))
+check("radix_sort, key", radix_sort(list(pairs), key=lambda p: p[0]) ==
+   sorted(pairs, key=lambda p: p[0]))
+
+print("External sorts:")
+scratch = tempfile.mkdtemp()
+for fmt, data in (("pickle", ints), ("npy", floats), ("text", words)):
+   ordered = sorted(data)
+   for limit, fanin in ((5000, 16), (300, 4), (300, 2)):
+      result = list(external_sort(data, max_in_memory=limit, fanin=fanin, format=fmt,
+         scratchdir=scratch))
+      check("{}, {} in memory, fan-in {}".format(fmt, limit, fanin), result == ordered)
+   check("{}: no runs left behind".format(fmt), os.listdir(scratch) == [])
+check("pickle, key", list(external_sort(pairs, max_in_memory=300, key=lambda p: -p[0],
+   scratchdir=scratch)) == sorted(pairs, key=lambda p: -p[0]))
+os.rmdir(scratch)
+
+if failures:
+   sys.exit("{} check(s) failed: {}".format(len(failures), ", ".join(failures)))
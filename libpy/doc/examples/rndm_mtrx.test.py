@@ -66,3 +66,87 @@ else:
    print("   The difference:")
    print(npu.format_array(abs(array-array2), displaylimit=9, perline=3, formatter="{1:e}"))
 print("   headers: {}, footers: {}".format(hdrs, ftrs))
+
+# The rest are checks that print "ok" or "FAILED" for each thing they check; the script exits
+# with an error if any failed.  Their files go in a scratch directory, not in testdata.
+
+import os
+import sys
+import tempfile
+scratch = tempfile.mkdtemp()
+failures = []
+def check(what, ok):
+   print("   {}: {}".format(what, "ok" if ok else "FAILED"))
+   if not ok: failures.append(what)
+
+#4) Round trips through the .arb format, compressed or not, including a structured dtype
+
+print("Round trips through .arb files:")
+big = rd.matrix(shape=(50, 7))
+records = np.zeros(5, dtype=[("day", "i4"), ("load", "f8"), ("host", "U8")])
+records["day"] = [3, 1, 4, 1, 5]
+records["host"] = ["a", "bb", "ccc", "dddd", "eeeee"]
+for name, original in (("floats", big), ("ints", (big*1000).astype(np.int64)), ("records", records)):
+   for compress in (True, False):
+      path = os.path.join(scratch, "{}.arb".format(name))
+      npu.writearb(path, original, headers="a header", footers="a footer", compress=compress,
+         rows_per_block=4)
+      copy, hdrs, ftrs = npu.readarb(path)
+      check("{}, compress={}".format(name, compress), copy.dtype == original.dtype and
+         np.array_equal(copy, original) and hdrs == ["a header\n"] and ftrs == ["a footer\n"])
+   check("{}, rows 2 to 9".format(name), np.array_equal(npu.readarb_rows(path, 2, 9), original[2:9]))
+
+#5) Block by block reading agrees with reading the whole file
+
+print("Reading .csv and .tbl files in blocks of rows:")
+csvpath = os.path.join(scratch, "blocks.csv")
+npu.writecsv(csvpath, big, perline=3)
+whole = npu.readcsv(csvpath)[0]
+for rows in (1, 3, 7, 50, 64):
+   blocks = list(npu.iter_csv_blocks(csvpath, rows))
+   check("csv, {} rows at a time".format(rows),
+      [start for start, block in blocks] == list(range(0, len(whole), rows)) and
+      np.array_equal(np.concatenate([block for start, block in blocks]), whole))
+tblpath = os.path.join(scratch, "blocks.tbl")
+npu.writetable(tblpath, big)
+whole = npu.readtable(tblpath)[0]
+for rows in (1, 3, 7, 50, 64):
+   blocks = list(npu.iter_table_blocks(tblpath, rows))
+   check("tbl, {} rows at a time".format(rows),
+      np.array_equal(np.concatenate([block for start, block in blocks]), whole))
+
+#6) block_iter hands back fixed-size chunks, even of an array that is not contiguous
+
+print("Chunks from block_iter:")
+for name, original in (("contiguous", big), ("transposed", big.T), ("sliced", big[::3, 1:])):
+   chunks = list(npu.block_iter(original, 16))
+   flat = np.ascontiguousarray(original).ravel()
+   sizes = [len(chunk) for index, chunk in chunks]
+   check("{}: sizes".format(name), sizes[:-1] == [16]*(len(sizes)-1) and 0 < sizes[-1] <= 16)
+   check("{}: entries".format(name),
+      np.array_equal(np.concatenate([chunk for index, chunk in chunks]), flat) and
+      all(original[tuple(index)] == chunk[0] for index, chunk in chunks))
+
+#7) A cache directory gives back what was parsed, and evicts the least recently used entry
+
+print("Reading through a cache directory:")
+cachedir = os.path.join(scratch, "cache")
+first = npu.readarray(csvpath, {'cache': cachedir})
+again = npu.readarray(csvpath, {'cache': cachedir})
+check("a cached read matches the parsed one",
+   np.array_equal(first[0], again[0]) and first[1:] == again[1:])
+entries = os.listdir(cachedir)
+oldest = os.path.join(cachedir, entries[0])
+os.utime(oldest, (0, 0)) # make sure it is the least recently used
+othercsv = os.path.join(scratch, "other.csv")
+npu.writecsv(othercsv, big + 1, perline=3)
+npu.readarray(othercsv, {'cache': cachedir, 'cachesize': 1.5*os.path.getsize(oldest)})
+remaining = os.listdir(cachedir)
+check("the older entry was evicted", len(remaining) == 1 and remaining[0] not in entries)
+
+for root, dirs, files in os.walk(scratch, topdown=False):
+   for name in files: os.remove(os.path.join(root, name))
+   for name in dirs: os.rmdir(os.path.join(root, name))
+os.rmdir(scratch)
+if failures:
+   sys.exit("{} check(s) failed: {}".format(len(failures), ", ".join(failures)))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+###
+#
+# Compares handing byte records from one process to another through a SharedVbQueue and through
+# a multiprocessing.Queue.  Arguments: record count, record size in bytes, batch size for the
+# SharedVbQueue consumer.
+
+from multiprocessing import Process, Queue
+import sys
+from time import time
+from vblist import SharedVbQueue
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 200*1000
+recordsize = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+batch = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+
+def produce_shared(q, n, recordsize):
+   record = bytes(recordsize)
+   for k in range(0, n):
+      q.add(record)
+   q.close()
+
+def produce_mpq(q, n, recordsize):
+   record = bytes(recordsize)
+   for k in range(0, n):
+      q.put(record)
+
+if __name__ == "__main__":
+   print("Passing {} records of {} bytes between two processes".format(n, recordsize))
+   # both queues are big enough to hold everything, so that neither producer ever waits
+   with SharedVbQueue(capacity=n*(recordsize+4)) as q:
+      start = time()
+      producer = Process(target=produce_shared, args=(q, n, recordsize))
+      producer.start()
+      received = 0
+      while received < n:
+         received += len(q.next(min(batch, q.size)))
+      producer.join()
+      timeshared = time() - start
+
+   mpq = Queue()
+   start = time()
+   producer = Process(target=produce_mpq, args=(mpq, n, recordsize))
+   producer.start()
+   for k in range(0, n):
+      mpq.get()
+   producer.join()
+   timempq = time() - start
+
+   print("   {:6.3f}s ({:9.0f} records/s) through a SharedVbQueue".format(timeshared, n/timeshared))
+   print("   {:6.3f}s ({:9.0f} records/s) through a multiprocessing.Queue".format(timempq, n/timempq))
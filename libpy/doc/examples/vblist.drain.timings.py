@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+###
+#
+# Times draining a vbqueue in batches with next(howMany) against the old way of removing a batch:
+# copying the slice and then deleting its entries one blist.__delitem__ call at a time.
+# Arguments: queue length, batch size.
+
+from blist import blist
+import sys
+from time import time
+from vblist import vbqueue, vbstack
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000*1000
+batch = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+def drain_one_at_a_time(q, batch):
+   # a queue drains from its head, a stack from its top
+   while q.size > 0:
+      count = min(batch, q.size)
+      first = 0 if isinstance(q, vbqueue) else q.size - count
+      answer = q[first:first+count]
+      for k in range(0, count): blist.__delitem__(q, first)
+
+def drain_by_slices(q, batch):
+   while q.size > 0:
+      q.next(min(batch, q.size))
+
+print("Draining {} entries in batches of {}".format(n, batch))
+for cls in (vbqueue, vbstack):
+   q = cls(range(0, n))
+   start = time()
+   drain_one_at_a_time(q, batch)
+   before = time() - start
+   q = cls(range(0, n))
+   start = time()
+   drain_by_slices(q, batch)
+   after = time() - start
+   print("   {}: {:6.3f}s one entry at a time, {:6.3f}s by slices".format(cls.__name__, before, after))
@@ -215,3 +215,63 @@ with openDbgMgr("vblist") as dbgmgr:
    qtg.extend([7,8,9])
    print("add [7,8,9] to qtg, getting: {}".format(qtg))
 
+
+print("------------------------------------------------")
+
+# Checks on the module's own buffers.  (The typed_vblist above is this script's, so the module is
+# imported again under another name.)  Each prints what it checked; the script exits with an error
+# if any failed.
+
+import array
+import os
+import sys
+import tempfile
+import vblist as vbl
+
+failures = []
+def check(what, ok):
+   print("{}: {}".format(what, "ok" if ok else "FAILED"))
+   if not ok: failures.append(what)
+
+tvl = vbl.typed_vblist([1, 2, 3], dtype=int)
+check("typed_vblist(dtype=int) stores 'q'", tvl.typecode == 'q')
+check("typed_vblist(dtype='f') stores 'f'", vbl.typed_vblist(dtype='f').typecode == 'f')
+check("typed_vblist.next() is the head", tvl.next() == 1)
+check("typed_vblist.next(2) is an array", tvl.next(2) == array.array('q', [2, 3]))
+check("typed_vblist.next_or_else() when empty", tvl.next_or_else(orElse=-1) == -1)
+check("typed_vblist.next_or_else(3) when empty",
+   tvl.next_or_else(3, orElse=-1) == array.array('q', [-1, -1, -1]))
+tvl.add_all([4, 5])
+check("typed_vblist.next_or_else(-3) pads after the tail",
+   tvl.next_or_else(-3, orElse=0) == array.array('q', [4, 5, 0]))
+check("vblist.next_or_else(3) when empty", vbl.vblist().next_or_else(3) == [None, None, None])
+
+scratch = tempfile.mkdtemp()
+spq = vbl.SpillingVbQueue(range(100), inmemory=8, segsize=4, scratchdir=scratch)
+check("SpillingVbQueue spills past 'inmemory'", len(os.listdir(scratch)) > 0)
+spq.add_all(range(100, 120))
+check("SpillingVbQueue keeps queue order", [spq.next() for n in range(120)] == list(range(120)))
+check("SpillingVbQueue removes drained segments", os.listdir(scratch) == [])
+spq.add_all(range(50))
+spq.close()
+check("SpillingVbQueue.close() removes the rest", os.listdir(scratch) == [])
+os.rmdir(scratch)
+
+with vbl.SharedVbQueue(capacity=64) as shq:
+   records = [bytes([n])*(n % 7 + 1) for n in range(200)]
+   taken = []
+   for record in records: # a few records at a time, so the ring wraps many times
+      shq.add(record)
+      if shq.size == 3: taken.extend(shq.next(2))
+   taken.extend(shq.next(shq.size))
+   check("SharedVbQueue wraps around in order", [bytes(r) for r in taken] == records)
+
+pq = vbl.vbpriorityqueue([5, 1, 4], maxsize=3)
+check("vbpriorityqueue evicts the largest when full", pq.push(2) and list(pq) == [1, 2, 4])
+check("vbpriorityqueue counts evictions", pq.evictions == 1)
+check("vbpriorityqueue refuses what it would evict", not pq.push(9) and list(pq) == [1, 2, 4])
+check("vbpriorityqueue.pushpop of a smaller entry", pq.pushpop(0) == 0 and list(pq) == [1, 2, 4])
+check("vbpriorityqueue.pushpop of a larger entry", pq.pushpop(3) == 1 and list(pq) == [2, 3, 4])
+
+if failures:
+   sys.exit("{} check(s) failed: {}".format(len(failures), ", ".join(failures)))
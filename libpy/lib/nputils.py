@@ -1,13 +1,23 @@
 
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import reduce
+from itertools import accumulate, repeat
+import hashlib
+import json
 import math
+import mmap
+from multiprocessing.shared_memory import SharedMemory
 import numpy as np
 import os as os
 import os.path as osp
 import re
+import struct
 import sys
 import sysutils as su
+import warnings
+import zipfile
+import zlib
 
 def to_shape(shape_info):
    if isinstance(shape_info, str):
@@ -55,44 +65,21 @@ def index2entry(index, array):
    return working
 
 def entry_iter(array):
-   rank = len(array.shape)
-   nextindex = np.zeros(rank, dtype = int)
-   working_n = rank-1
-   while isinshape(nextindex, array.shape):
-      rv = index2entry(nextindex, array)
-      bumped = nextindex[working_n] + 1
-      if bumped < array.shape[working_n]:
-         nextindex[working_n] = bumped
-         yield rv
-      elif working_n > 0:
-         for k in range(working_n, rank):
-            nextindex[k] = 0
-         working_n -= 1
-         nextindex[working_n] += 1
-         working_n = rank-1
-         yield rv
-      else:
-         raise StopIteration()
+   return iter(array.flat)
 
 def index_iter(shape):
-   rank = len(shape)
-   nextindex = np.zeros(rank, dtype = int)
-   working_n = rank-1
-   while isinshape(nextindex, shape):
-      rv = nextindex.copy()
-      bumped = nextindex[working_n] + 1
-      if bumped < shape[working_n]:
-         nextindex[working_n] = bumped
-         yield rv
-      elif working_n > 0:
-         for k in range(working_n, rank):
-            nextindex[k] = 0
-         working_n -= 1
-         nextindex[working_n] += 1
-         working_n = rank-1
-         yield rv
-      else:
-         raise StopIteration()
+   return (np.array(index, dtype=int) for index in np.ndindex(*to_shape(shape)))
+
+def block_iter(array, blocksize=8192):
+   array = np.asarray(array)
+   blocksize = max(1, int(blocksize))
+   if array.flags.c_contiguous:
+      entries = array.reshape(-1).view()
+      entries.flags.writeable = False
+   else:
+      entries = array.flat # slicing it copies just the entries sliced
+   for offset in range(0, array.size, blocksize):
+      yield (_nth_index(offset, array.shape), entries[offset:offset+blocksize])
 
 MACHINE_EPSILON = np.finfo(np.float).eps
 
@@ -106,20 +93,19 @@ def asunitnorm(array, tolerance = None):
       return array/norm
 
 def _nth_index(n, shape):
-   # in the size check, a shape with one or more zeros--e.g. (3,0,1)--will have size
-   # 0, and hence will cause the error to be raised, because such an array must be
-   # empty.
-   if not isinstance(n, int):
-      ValueError("Expected an integer, but got {}".su.a_classname(n))
-   elif n < 0 or n >= sizefromshape(shape):
+   # n is an integer or an array of them.  in the size check, a shape with one or more
+   # zeros--e.g. (3,0,1)--will have size 0, and hence will cause the error to be raised,
+   # because such an array must be empty.
+   many = np.asarray(n)
+   if many.dtype.kind not in "iu":
+      raise ValueError("Expected an integer, but got {}".format(su.a_classname(n)))
+   size = sizefromshape(shape) if len(shape) > 0 else 1
+   if many.size > 0 and (many.min() < 0 or many.max() >= size):
+      bad = many.min() if many.min() < 0 else many.max()
       msg = "{}-th entry requested, but there are only {}."
-      raise ValueError(msg.format(n, sizefromshape(shape)))
-   raw_list = [0 for k in range(0, len(shape))]
-   for k in range(len(shape)-1, -1, -1):
-      coord = n % shape[k]
-      raw_list[k] = coord
-      n = (n - coord)//shape[k]
-      if n == 0: return tuple(raw_list)
+      raise ValueError(msg.format(bad, size))
+   index = np.unravel_index(many, shape)
+   return tuple([int(k) for k in index]) if many.ndim == 0 else index
 
 def _format(array, begins, ends, perline, formatter, separator, ender):
    total = begins+ends
@@ -133,21 +119,23 @@ def _format(array, begins, ends, perline, formatter, separator, ender):
    shape_in = array.shape
    array.shape = (array.size,)
    left = ""
-   for n in range(0, begins):
-      suffix = ender if (n+1) % perline is 0 else separator
+   indices = zip(*[k.tolist() for k in _nth_index(np.arange(0, begins), shape_in)])
+   for n, index in zip(range(0, begins), indices):
+      suffix = ender if (n+1) % perline == 0 else separator
       array_n = array[n]
       if isinstance(array_n, complex) and array_n.imag == 0.0:
          array_n = array_n.real 
-      left += formatter.format(_nth_index(n,shape_in),array_n)+suffix
+      left += formatter.format(index,array_n)+suffix
    left_trimmed = left if left.endswith(ender) else left[0:-len(separator)]
    right = ""
    first = array.size - ends
-   for m in range(first, array.size):
-      suffix = ender if (m-first+1) % perline is 0 else separator
+   indices = zip(*[k.tolist() for k in _nth_index(np.arange(first, array.size), shape_in)])
+   for m, index in zip(range(first, array.size), indices):
+      suffix = ender if (m-first+1) % perline == 0 else separator
       array_m = array[m]
       if isinstance(array_m, complex) and array_m.imag == 0.0:
          array_m = array_m.real 
-      right += formatter.format(_nth_index(m, shape_in),array_m)+suffix
+      right += formatter.format(index,array_m)+suffix
    right_trimmed = right[0:-len(ender)] if right.endswith(ender) else right[0:-len(separator)]
    array.shape = shape_in
    if begins > 0:
@@ -239,30 +227,177 @@ def typefromvalue(value):
 
 
 def readarray(path, options={}):
+   if options.get('cache'):
+      options = dict(options, cache=_cache_location(options['cache']))
+      ignore, basetype = osp.splitext(_PATH_PARM_RE.match(path).group(1))
+      if basetype in (".csv", ".tbl"):
+         return _read_through_cache(path, options)
    ignore, basetype = osp.splitext(path)
    if basetype.startswith('.np'):
+      mmap = options.get('mmap') or None
       if basetype.startswith('.npz#'): # field name in the loaded file's dict
          namestart = 5 + path.rfind('.npz#')
-         path = path[0:namestart+4]
          name = path[namestart:]
-         return (np.load(path)[name], [], [])
+         path = path[0:namestart-1]
+         return (_read_npz_member(path, name, mmap), [], [])
       else:
-         return (np.load(path), [], [])
+         return (np.load(path, mmap_mode=mmap), [], [])
    elif basetype == ".csv":
       return readcsv(path, options)
    elif basetype == ".tbl": 
       return readtable(path, options)
+   elif basetype == ".arb":
+      return readarb(path, options)
    else:
       raise ValueError("Unexpected file type, '{}', for a matrix".format(basetype))
 
+_CACHE_OPTIONS = ('cache', 'cachesize')
+_CACHE_SUFFIX = ".cache.npz"
+
+def _cache_location(cache):
+   """ checks the 'cache' option: True means "sidecar", anything else must name a directory """
+   if cache is True or cache == "sidecar":
+      return "sidecar"
+   if not isinstance(cache, (str, os.PathLike)):
+      msg = "The 'cache' option must be True, \"sidecar\", or a directory path, not {!r}"
+      raise ValueError(msg.format(cache))
+   cache = os.fspath(cache)
+   if osp.exists(cache) and not osp.isdir(cache):
+      raise ValueError("The 'cache' option, '{}', is not a directory".format(cache))
+   return cache
+
+def _read_through_cache(path, options):
+   parse_options = {k: v for k, v in options.items() if k not in _CACHE_OPTIONS}
+   filepath = _PATH_PARM_RE.match(path).group(1)
+   stat = os.stat(filepath)
+   keyed_options = {k: v for k, v in parse_options.items() if k != 'workers'}
+   key = json.dumps([osp.abspath(path), stat.st_size, stat.st_mtime_ns, keyed_options],
+      sort_keys=True, default=str)
+   if options['cache'] == "sidecar":
+      cachepath = filepath + _CACHE_SUFFIX
+   else:
+      digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[0:16]
+      cachepath = osp.join(options['cache'], osp.basename(filepath) + "." + digest + _CACHE_SUFFIX)
+   try:
+      with np.load(cachepath) as cached:
+         if str(cached['key']) == key:
+            second, third = json.loads(str(cached['extras']))
+            result = (cached['array'], second, third)
+            if cachepath != filepath + _CACHE_SUFFIX: os.utime(cachepath) # recently used
+            return result
+   except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+      pass # not cached, or not readable: either way, parse the file
+   array, second, third = readarray(path, parse_options)
+   try:
+      os.makedirs(osp.dirname(cachepath) or ".", exist_ok=True)
+      temppath = "{}.{}.tmp".format(cachepath, os.getpid())
+      with open(temppath, "wb") as f:
+         np.savez(f, array=array, key=np.array(key), extras=np.array(json.dumps([second, third])))
+      os.replace(temppath, cachepath) # so that no reader ever sees half a file
+      if options['cache'] != "sidecar":
+         _evict_from_cache(options['cache'], int(float(options.get('cachesize') or 2**30)))
+   except OSError as e:
+      print("WARNING: could not cache '{}': {}".format(path, e), file=sys.stderr)
+   return (array, second, third)
+
+def _evict_from_cache(cachedir, cachesize):
+   entries = []
+   for name in os.listdir(cachedir):
+      if name.endswith(_CACHE_SUFFIX):
+         entrypath = osp.join(cachedir, name)
+         try:
+            stat = os.stat(entrypath)
+         except OSError:
+            continue # some other process evicted it first
+         entries.append((stat.st_mtime, stat.st_size, entrypath))
+   total = sum(size for ignore, size, ignore2 in entries)
+   for ignore, size, entrypath in sorted(entries): # least recently used first
+      if total <= cachesize: break
+      try:
+         os.remove(entrypath)
+      except OSError:
+         pass
+      total -= size
+
+_NPY_HEADER_READERS = {
+   (1, 0): np.lib.format.read_array_header_1_0,
+   (2, 0): np.lib.format.read_array_header_2_0
+}
+
+def _read_npz_member(path, name, mmap):
+   member = name if name.endswith(".npy") else name + ".npy"
+   if mmap not in (None, 'r', 'c'):
+      raise ValueError("'{}' cannot be memory mapped in mode '{}'".format(path, mmap))
+   with zipfile.ZipFile(path) as archive:
+      try:
+         info = archive.getinfo(member)
+      except KeyError:
+         raise KeyError("There is no array '{}' in '{}'".format(name, path)) from None
+      if mmap is not None and info.compress_type == zipfile.ZIP_STORED:
+         with open(path, "rb") as f:
+            # the member's data follows its local header, whose last two fields are the
+            # lengths of the file name and the "extra" field that end it
+            f.seek(info.header_offset + 26)
+            namelength, extralength = struct.unpack("<HH", f.read(4))
+            f.seek(namelength + extralength, os.SEEK_CUR)
+            readheader = _NPY_HEADER_READERS.get(np.lib.format.read_magic(f))
+            if readheader is not None:
+               shape, fortran_order, dtype = readheader(f)
+               if not dtype.hasobject:
+                  return np.memmap(path, dtype=dtype, mode=mmap, offset=f.tell(), shape=shape,
+                     order='F' if fortran_order else 'C')
+      with archive.open(member) as f:
+         return np.lib.format.read_array(f)
+
+def readarrays(paths, options={}, workers=None):
+   workers = (os.cpu_count() or 1) if workers is None else workers
+   if workers < 2 or len(paths) < 2:
+      return [_readarray_or_error(path, options) for path in paths]
+   # the files are already being read in parallel: no pools within the pool, please
+   options = {k: v for k, v in options.items() if k != 'workers'}
+   parsed = [n for n in range(0, len(paths)) if _parses_text(paths[n], options)]
+   loaded = [n for n in range(0, len(paths)) if not _parses_text(paths[n], options)]
+   results = [None]*len(paths)
+   processes = ProcessPoolExecutor(max_workers=min(workers, len(parsed))) if parsed else None
+   try:
+      futures = {}
+      if processes is not None:
+         for n in parsed: futures[n] = processes.submit(readarray, paths[n], options)
+      if len(loaded) > 0:
+         with ThreadPoolExecutor(max_workers=min(workers, len(loaded))) as threads:
+            for n in loaded: futures[n] = threads.submit(readarray, paths[n], options)
+            for n in loaded: results[n] = _result_or_error(futures[n])
+      for n in parsed: results[n] = _result_or_error(futures[n])
+   finally:
+      if processes is not None: processes.shutdown()
+   return results
+
+def _parses_text(path, options):
+   # True unless reading path is a matter of I/O (and decompressing), which threads do well
+   ignore, basetype = osp.splitext(_PATH_PARM_RE.match(path).group(1))
+   return basetype in (".csv", ".tbl") and not options.get('cache')
+
+def _readarray_or_error(path, options):
+   try:
+      return readarray(path, options)
+   except Exception as e:
+      return e
+
+def _result_or_error(future):
+   error = future.exception()
+   return future.result() if error is None else error
+
 def writearray(path, array, ext="npy", **kwargs):
-   path, ext = _resolve_basename(path, array, ext)
+   if not ext.startswith('.'): ext = '.' + ext
+   path, ext = _resolve_basename(path, array, ext[1:])
    if ext == '.npy':
       np.save(path, array, **kwargs)
    elif ext == '.csv':
       writecsv(path, array, **kwargs)
    elif ext == '.tbl':
       writetable(path, array, **kwargs)
+   elif ext == '.arb':
+      writearb(path, array, **kwargs)
    else:
       raise ValueError("Unexpected extension, '{}', for array path.".format(ext))
 
@@ -274,6 +409,7 @@ def optiondefaults():
       "dtype"  : "int32", # again: same meaning as for an ndarray
       "sep"    : '|',     # a single character that is the field separator
       "dbgnpu" : False,   # show debugging printouts?
+      "workers": 1,       # readcsv only: processes parsing the data
                           # the two below are needed only for readtable/writetable
       "rskip"  : 0,       # the number of heading rows to skip
       "cskip"  : 0        # the number of heading columns to skip
@@ -313,6 +449,7 @@ def _readfirstline(f, options, defaults):
    options['rskip'] = int(options['rskip'])
    options['cskip'] = int(options['cskip'])
    options["dbgnpu"] = su.asboolean(options['dbgnpu'])
+   options['workers'] = int(options['workers'])
    return f.readline() if line.startswith("#?") else line   
 
 def _parseurlparms(urlparms, local_options, defaults):
@@ -323,8 +460,8 @@ def _parseurlparms(urlparms, local_options, defaults):
       if defaults["dbgnpu"]: print("parm is '{}'".format(parm))
       (name, value) = parm.split('=')  # 
       if name in defaults:
-         oldvalue = local_options[name]
-         default = defaults[name] 
+         default = defaults[name]
+         oldvalue = local_options.get(name, default)
          if name in local_options and oldvalue != default and oldvalue != value:
             msg = "WARNING: {} is '{}' in the path, but '{}' in the parameters"
             print(msg.format(name, oldvalue, value), file=sys.stderr)
@@ -339,67 +476,69 @@ def readtable(path, options={}):
    path, options = _parseparms(path, options)
    with open(path) as f:
       line = _readfirstline(f, options, optiondefaults())
-      if options["dbgnpu"]: print("line after first is '{}'".format(line))
-      separator = options['sep']
-      column_headings = []
-      row_headings = []
-      # ignore any header lines to get to the first line of data
-      first_data_column = options['cskip']
-      for n in range(0, options['rskip']):
-         headings = line.strip().split(separator)
-         column_headings.append(headings[first_data_column:])
-         line = f.readline()
-         if options["dbgnpu"]: print("headings {}: '{}'".format(n, line))
-      # read the first row containing real data and use it to determine the matrix
-      # size, if the options do not already do that.
-      row = line.strip().split(separator)
-      if options['dbgnpu']:
-         msg = "Matrix starts at column {}; separator: '{}'" 
-         print(msg.format(first_data_column, separator))
-         print("First row: {}".format(row))
-      fields_per_line = len(row)
-      cols = fields_per_line - first_data_column
-      shape = options['shape']
-      if shape != None: 
-         expected = shape[1] if len(shape) > 1 else shape[0]
-         if cols != expected:
-            msg = "Expected {} data columns, but first line has {}"
-            raise ValueError(msg.format(expected,cols))
-         rows = shape[0] if len(shape) > 1 else 1
-      else:
-         rows = cols
-         shape = (cols, cols)
-         print("WARNING: no shape specified: {} assumed.".format(shape),file=sys.stderr)
-      if options['dbgnpu']: print("{} data fields in the first row.".format(cols))
-      data_range = range(first_data_column, fields_per_line)
-
-      # allocate and fill in the matrix
-      entrytype = options["dtype"]
-      matrix    = np.zeros(shape, dtype=entrytype)
-
-      # we've already read the first row
-      if first_data_column > 0: 
-         row_headings.append(row[0:first_data_column])
-      for j in data_range:
-         matrix[0, j-first_data_column] = entrytype(row[j].strip()) 
-
-      # now read the remaining rows
-      i = 1 # next row to update
-      while i < rows:
-         line = f.readline()
-         if options["dbgnpu"]: print("row {}: {}".format(i, line))
-         if len(line) == 0:
-            raise IOError("{} rows found at EOF, but {} were expected".format(i,rows))
-         row = line.strip().split(separator)
-         if len(row) != fields_per_line:
-            msg = "{} fields found in row {}, but {} were expected"
-            raise IOError(msg.format(len(row), i, cols))
-         if first_data_column > 0:
-            row_headings.append(row[0:first_data_column])
-            for j in data_range:
-               matrix[i, j-first_data_column] = entrytype(row[j].strip())
-         i += 1
-   return (matrix, column_headings, row_headings)
+      lines = (line + f.read()).splitlines()
+   if options["dbgnpu"]: print("line after first is '{}'".format(line))
+   separator = options['sep']
+   first_data_column = options['cskip']
+   rskip = options['rskip']
+   if len(lines) <= rskip:
+      raise IOError("{} lines found at EOF, but there are {} heading rows".format(
+         len(lines), rskip))
+   column_headings = [heading.strip().split(separator)[first_data_column:]
+      for heading in lines[0:rskip]]
+   # the first row containing real data determines the matrix size, if the options do not
+   fields_per_line, rows, cols, shape = _table_shape(lines[rskip], options)
+   data_lines = [row.strip() for row in lines[rskip:rskip+rows]]
+   if len(data_lines) < rows:
+      raise IOError("{} rows found at EOF, but {} were expected".format(len(data_lines),rows))
+   numeric, row_headings = _table_rows(data_lines, 0, fields_per_line, options)
+   matrix = _parse_entries(numeric, options['sep'], options["dtype"])
+   if matrix.size != rows*cols:
+      raise ValueError("Read {} entries, but expected {}".format(matrix.size, rows*cols))
+   return (matrix.reshape(shape), column_headings, row_headings)
+
+def _table_shape(first_row, options):
+   separator = options['sep']
+   first_data_column = options['cskip']
+   fields_per_line = first_row.strip().count(separator) + 1
+   cols = fields_per_line - first_data_column
+   if options['dbgnpu']:
+      msg = "Matrix starts at column {}; separator: '{}'"
+      print(msg.format(first_data_column, separator))
+      print("First row: {}".format(first_row))
+   shape = options['shape']
+   if shape != None:
+      expected = shape[1] if len(shape) > 1 else shape[0]
+      if cols != expected:
+         msg = "Expected {} data columns, but first line has {}"
+         raise ValueError(msg.format(expected,cols))
+      rows = shape[0] if len(shape) > 1 else 1
+   else:
+      rows = cols
+      shape = (cols, cols)
+      print("WARNING: no shape specified: {} assumed.".format(shape),file=sys.stderr)
+   if options['dbgnpu']: print("{} data fields in the first row.".format(cols))
+   return fields_per_line, rows, cols, shape
+
+def _table_rows(data_lines, first_row, fields_per_line, options):
+   # checks the (stripped) rows' field counts, peels the row headings off the front of each
+   # row, and returns what is left, ready for _parse_entries, with the headings
+   separator = options['sep']
+   first_data_column = options['cskip']
+   for i in range(0, len(data_lines)):
+      if data_lines[i].count(separator) + 1 != fields_per_line:
+         msg = "{} fields found in row {}, but {} were expected"
+         raise IOError(msg.format(data_lines[i].count(separator) + 1, first_row + i,
+            fields_per_line))
+   row_headings = []
+   if first_data_column > 0:
+      numeric = []
+      for row in data_lines:
+         fields = row.split(separator, first_data_column)
+         row_headings.append(fields[0:first_data_column])
+         numeric.append(fields[first_data_column])
+      data_lines = numeric
+   return "\n".join(data_lines), row_headings
 
 def readcsv(path, options={}):
    path, options = _parseparms(path, options)
@@ -410,48 +549,229 @@ def readcsv(path, options={}):
       shape = options['shape']
       totalsize = sizefromshape(shape)
       entrytype = options['dtype']
-      array = np.zeros((totalsize,), dtype=entrytype)
-      n = 0
       headers = []
       while len(line) > 0 and line[0] == '#':
          headers.append(line[1:])
          line = f.readline()
-      while len(line) > 0 and line[0] != '#':
-         if line != "\n":
-            for entry in line.split(separator):
-               array[n] = entrytype(entry)
-               n += 1
+      if options['workers'] > 1:
+         return _readcsv_parallel(path, options, headers)
+      # the data runs from here to the first footer line: read it all as one block
+      rest = line + f.read()
+   footerStart = rest.find("\n#") + 1 # rest does not start with '#': the header loop saw to that
+   if footerStart == 0: footerStart = len(rest) # no footers
+   array = _parse_entries(rest[0:footerStart], separator, entrytype)
+   footers = [line[1:] for line in rest[footerStart:].splitlines(keepends=True)]
+   if array.size != totalsize:
+      raise ValueError("Read {} entries, but expected {}".format(array.size, totalsize))
+   return (array.reshape(shape), headers, footers)
+
+_MIN_RANGE = 1 << 20 # the fewest bytes of text worth a process of its own
+
+def _readcsv_parallel(path, options, headers):
+   separator = options['sep']
+   shape = options['shape']
+   totalsize = sizefromshape(shape)
+   dtype = np.dtype(options['dtype'])
+   with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+      dataStart = 0
+      while mm[dataStart:dataStart+1] == b"#": # the "#?" line and the headers
+         dataStart = mm.find(b"\n", dataStart) + 1 or len(mm)
+      dataEnd = mm.find(b"\n#", dataStart) + 1 or len(mm)
+      footers = [line[1:] for line in mm[dataEnd:].decode().splitlines(keepends=True)]
+      workers = max(1, min(options['workers'], (dataEnd - dataStart)//_MIN_RANGE))
+      if len(separator.strip()) == 0: workers = 1 # no cheap way to count the entries
+      bounds = [dataStart]
+      for k in range(1, workers): # cut just after a newline near each k/workers of the way
+         cut = mm.find(b"\n", max(bounds[-1], dataStart + (dataEnd - dataStart)*k//workers),
+            dataEnd)
+         bounds.append(dataEnd if cut < 0 else cut + 1)
+      bounds.append(dataEnd)
+      if workers == 1:
+         return (_parse_block(mm[dataStart:dataEnd], options), headers, footers)
+   fitted = False
+   shm = SharedMemory(create=True, size=max(1, totalsize*dtype.itemsize))
+   try:
+      with ProcessPoolExecutor(max_workers=workers) as pool:
+         counts = list(pool.map(_count_entries, repeat(path), bounds[:-1], bounds[1:],
+            repeat(separator)))
+         if sum(counts) == totalsize:
+            offsets = [0] + list(accumulate(counts))[:-1]
+            fitted = all(pool.map(_parse_range_into, repeat(path), bounds[:-1], bounds[1:],
+               repeat(separator), repeat(dtype.str), repeat(shm.name), repeat(totalsize),
+               offsets, counts))
+      if fitted:
+         array = np.ndarray((totalsize,), dtype=dtype, buffer=shm.buf).copy().reshape(shape)
+   finally:
+      shm.close()
+      shm.unlink()
+   if not fitted: # a count was off: parse it all here, and let that complain if need be
+      with open(path, 'rb') as f:
+         f.seek(dataStart)
+         array = _parse_block(f.read(dataEnd - dataStart), options)
+   return (array, headers, footers)
+
+def _parse_block(data, options):
+   array = _parse_entries(data.decode(), options['sep'], np.dtype(options['dtype']).type)
+   totalsize = sizefromshape(options['shape'])
+   if array.size != totalsize:
+      raise ValueError("Read {} entries, but expected {}".format(array.size, totalsize))
+   return array.reshape(options['shape'])
+
+def _read_range(path, lo, hi):
+   with open(path, 'rb') as f:
+      f.seek(lo)
+      return f.read(hi - lo)
+
+def _count_entries(path, lo, hi, separator):
+   # one entry per separator, plus one per line with something on it.  Only empty lines that
+   # are alone are caught here: any other blank line throws the count off, which the process
+   # parsing the range will notice.
+   data = _read_range(path, lo, hi)
+   empty = data.count(b"\n\n") + data.startswith(b"\n") + \
+      (len(data) == 0 or data.endswith(b"\n"))
+   return data.count(separator.encode()) + data.count(b"\n") + 1 - empty
+
+def _parse_range_into(path, lo, hi, separator, dtype, name, totalsize, offset, count):
+   dtype = np.dtype(dtype)
+   parsed = _parse_entries(_read_range(path, lo, hi).decode(), separator, dtype.type)
+   if parsed.size != count:
+      return False
+   shm = SharedMemory(name=name)
+   try:
+      np.ndarray((totalsize,), dtype=dtype, buffer=shm.buf)[offset:offset+count] = parsed
+   finally:
+      shm.close()
+   return True
+
+def iter_csv_blocks(path, rows_per_block, options={}):
+   path, options = _parseparms(path, options)
+   with open(path, 'rt') as f:
+      line = _readfirstline(f, options, optiondefaults())
+      separator = options['sep']
+      shape = options['shape']
+      totalsize = sizefromshape(shape)
+      entrytype = options['dtype']
+      rowshape = tuple(shape[1:])
+      rowsize = sizefromshape(rowshape) if len(rowshape) > 0 else 1
+      blocksize = max(1, rows_per_block)*rowsize
+      while len(line) > 0 and line[0] == '#': # the headers
          line = f.readline()
-      footers = []
-      while len(line)>0:
-         footers.append(line[1:])
+      pending = np.zeros((0,), dtype=entrytype) # parsed, but not yet yielded
+      row_offset = 0
+      done = False
+      while not done:
+         lines = []
+         count = len(pending)
+         while count < blocksize: # read just enough lines to fill a block
+            if len(line) == 0 or line[0] == '#': # EOF or the footers
+               done = True
+               break
+            lines.append(line)
+            count += len(line.split(separator)) if len(line.strip()) > 0 else 0
+            line = f.readline()
+         if len(lines) > 0:
+            parsed = _parse_entries("".join(lines), separator, entrytype)
+            pending = np.concatenate((pending, parsed))
+         while len(pending) >= blocksize or (done and len(pending) >= rowsize):
+            take = min(blocksize, (len(pending)//rowsize)*rowsize)
+            if row_offset*rowsize + take > totalsize:
+               msg = "Read more than the {} entries expected"
+               raise ValueError(msg.format(totalsize))
+            yield (row_offset, pending[0:take].reshape((take//rowsize,) + rowshape))
+            pending = pending[take:]
+            row_offset += take//rowsize
+   if row_offset*rowsize + len(pending) != totalsize:
+      msg = "Read {} entries, but expected {}"
+      raise ValueError(msg.format(row_offset*rowsize + len(pending), totalsize))
+
+def iter_table_blocks(path, rows_per_block, options={}):
+   path, options = _parseparms(path, options)
+   with open(path) as f:
+      line = _readfirstline(f, options, optiondefaults())
+      for n in range(0, options['rskip']): # the column headings
          line = f.readline()
-      if n != totalsize:
-         raise ValueError("Read {} entries, but expected {}".format(n, totalsize))
-      return (array.reshape(shape), headers, footers)
+      if len(line) == 0:
+         raise IOError("EOF found before any data in '{}'".format(path))
+      fields_per_line, rows, cols, shape = _table_shape(line, options)
+      row_offset = 0
+      while row_offset < rows:
+         count = min(max(1, rows_per_block), rows - row_offset)
+         data_lines = []
+         for k in range(0, count):
+            if len(line) == 0:
+               msg = "{} rows found at EOF, but {} were expected"
+               raise IOError(msg.format(row_offset + k, rows))
+            data_lines.append(line.strip())
+            line = f.readline()
+         numeric, ignore = _table_rows(data_lines, row_offset, fields_per_line, options)
+         block = _parse_entries(numeric, options['sep'], options['dtype'])
+         if block.size != count*cols:
+            msg = "Read {} entries in rows {} to {}, but expected {}"
+            raise ValueError(msg.format(block.size, row_offset, row_offset+count-1, count*cols))
+         yield (row_offset, block.reshape((count, cols)))
+         row_offset += count
+
+_NUMERIC_CHARS = frozenset("0123456789+-.eEinfatyINFATY") # what a number's text may hold
+
+def _parse_entries(text, separator, entrytype):
+   # the entries in text, in order, however they are divided among lines
+   if len(separator.strip()) == 0:
+      pass # np.fromstring's " " matches any run of whitespace, newlines included
+   elif _NUMERIC_CHARS.isdisjoint(separator):
+      text = text.replace(separator, " ")
+   else: # a blank in place of a separator like "-" or "e" would split numbers: split first
+      text = " ".join(entry for line in text.splitlines() if len(line.strip()) > 0
+         for entry in line.split(separator))
+   if len(text.strip()) == 0:
+      return np.zeros((0,), dtype=entrytype)
+   if np.dtype(entrytype).kind in "iuf":
+      try:
+         with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning) # older NumPys only warn
+            return np.fromstring(text, dtype=entrytype, sep=" ")
+      except (ValueError, DeprecationWarning):
+         pass # NumPy cannot parse something: let the entry type say what
+   return np.array([entrytype(entry) for entry in text.split()], dtype=entrytype)
 
 def _resolve_basename(path, array, ext):
    if not osp.isdir(path):
       (ignore, actual_ext) = osp.splitext(path)
       if len(actual_ext) == 0:
-         actual_ext = ext
+         actual_ext = os.extsep + ext
+         path += actual_ext
       return (path, actual_ext)
    else:
       if not path.endswith(os.sep): path += os.sep
       shape_str = 'x'.join([str(n) for n in array.shape])
       formatString = "{0}array_{1}{2}{3}{2}{4}{2}{5}"
-      entrytype = typename(numpytype(kind) if kind != None else array.dtype)
+      entrytype = typename(array.dtype)
       timestamp = su.now2IntLiteral(36)[-4:]
       resolved = formatString.format(
          path, shape_str, os.extsep, entrytype, timestamp, ext
       )
-      return (path, ext)
+      return (resolved, os.extsep + ext)
+
+_WRITE_BLOCK = 1 << 16     # entries formatted per call to the % operator
+_WRITE_BUFFER = 1 << 20    # bytes buffered per write to the file
+
+def _entry_format(entrytype):
+   # the %-format for one entry, and the number of values it consumes
+   code = typeformat(entrytype)
+   if typename(entrytype)[0] == 'c':
+      return "%{0}%+{0}j".format(code), 2
+   return "%"+code, 1
+
+def _entry_values(block):
+   # the entries of block as Python scalars, in the order _entry_format expects them
+   if block.dtype.kind == 'c':
+      block = np.stack((block.real, block.imag), axis=-1)
+   return block.ravel().tolist()
 
 def writetable(path, matrix, rowheaders=None, colheaders=None, sep='|', selfid=True):
    if len(matrix.shape) == 1:
-      matrix = matrix.reshape(1, matrix.shape(0))
+      matrix = matrix.reshape(1, matrix.shape[0])
    elif len(matrix.shape) != 2:
-      raise TypeError("Expected a vector or matrix, but got shape {}".format(shape))
+      raise TypeError("Expected a vector or matrix, but got shape {}".format(matrix.shape))
    path, ignore = _resolve_basename(path, matrix, "tbl")
    (rows, cols) = matrix.shape
    if rowheaders is None: rskip = 0
@@ -463,26 +783,33 @@ def writetable(path, matrix, rowheaders=None, colheaders=None, sep='|', selfid=T
        shape = colheaders.shape
        cskip = 1 if len(shape) == 1 else shape[1]
    entrytype = typename(matrix.dtype)
-   formatString = "{0:"+typeformat(entrytype)+"}"
-   with open(path, "wt") as f:
+   entryFormat, ignore = _entry_format(entrytype)
+   # "%" in a heading is harmless: the headings are arguments to the format, not part of it
+   rowFormat = sep.join([entryFormat]*cols) + "\n"
+   if cskip != 0: rowFormat = "%s" + sep + rowFormat
+   rowsPerBlock = max(1, _WRITE_BLOCK//max(1, cols))
+   with open(path, "wt", buffering=_WRITE_BUFFER) as f:
       if selfid:
          firstlinefmt = "#? shape={}x{}&rskip={}&cskip={}&dtype={}&sep={}\n"
          f.write(firstlinefmt.format(rows, cols, rskip, cskip, entrytype, sep))
       if rskip != 0:
          f.write(sep.join([str(x) for row in rowheaders for x in row])+"\n")
-      if cskip == 0:
-         for row in matrix:
-            fwrite(sep.join([formatString.format(x) for x in row])+"\n" )
-      else:
-         for n in range(0, rows):
-            headers = sep.join([str(x) for x in colheaders[n]])
-            the_row = sep.join([formatString.format(x) for x in matrix[n]])
-            f.write(sep.join([headers, the_row]) + "\n")
+      for n in range(0, rows, rowsPerBlock):
+         block = matrix[n:n+rowsPerBlock]
+         values = _entry_values(block)
+         if cskip != 0:
+            perRow = len(values)//len(block)
+            args = []
+            for k in range(0, len(block)):
+               args.append(sep.join([str(x) for x in colheaders[n+k]]))
+               args.extend(values[k*perRow:(k+1)*perRow])
+            values = args
+         f.write((rowFormat*len(block)) % tuple(values))
 
 def writecsv(path, array, headers="", footers="", perline=10, sep='|', selfid=True):
    path, ignore = _resolve_basename(path, array, "csv")
    entrytype = typename(array.dtype)
-   formatString = "{0:"+typeformat(entrytype)+"}"
+   entryFormat, ignore = _entry_format(entrytype)
    shape = array.shape
    if len(shape)==1:
       rows = 1
@@ -491,18 +818,122 @@ def writecsv(path, array, headers="", footers="", perline=10, sep='|', selfid=Tr
       rows = shape[0]
       cols = shape[1]
    reshaped = array.reshape((array.size,))
-   with open(path, "wt") as f:
+   perline = max(1, perline)
+   lineFormat = sep.join([entryFormat]*perline) + "\n"
+   entriesPerBlock = max(1, _WRITE_BLOCK//perline)*perline # whole lines only
+   with open(path, "wt", buffering=_WRITE_BUFFER) as f:
       if selfid:
          f.write("#? shape={}x{}&dtype={}\n".format(rows, cols, entrytype))
       if len(headers) > 0:
          for line in headers.split("\n"):
             f.write("#"+line+"\n")
-      n = 0
-      while n < array.size:
-         next_n = n + perline
-         slice_n = reshaped[n : next_n] 
-         f.write(sep.join([formatString.format(x) for x in slice_n])+"\n" )
-         n = next_n
+      for n in range(0, array.size, entriesPerBlock):
+         block = reshaped[n : n + entriesPerBlock]
+         lines, extra = divmod(block.size, perline)
+         text = (lineFormat*lines + sep.join([entryFormat]*extra) + ("\n" if extra else ""))
+         f.write(text % tuple(_entry_values(block)))
       if len(footers) > 0:
          for line in footers.split("\n"):
             f.write("#"+line+"\n")
+
+
+_ARB_MAGIC = b"#?arb 1\n"
+_ARB_TRAILER = struct.Struct("<Q8s")
+
+def writearb(path, array, headers="", footers="", rowheaders=None, colheaders=None,
+      compress=True, rows_per_block=0):
+   path, ignore = _resolve_basename(path, array, "arb")
+   array = np.asarray(array)
+   if array.dtype.hasobject:
+      raise TypeError("An array of Python objects cannot be written as '.arb'")
+   rows = array.reshape((1,) if array.ndim == 0 else array.shape)
+   rowbytes = max(1, rows[0:1].nbytes)
+   if rows_per_block <= 0:
+      rows_per_block = max(1, (1 << 20)//rowbytes)
+   level = (1 if compress is True else int(compress)) if compress is not False else -1
+   meta = {
+      "shape": list(array.shape), "dtype": np.lib.format.dtype_to_descr(array.dtype),
+      "rows_per_block": rows_per_block,
+      "compression": "zlib" if level >= 0 else "none",
+      "headers": headers.split("\n") if len(headers) > 0 else [],
+      "footers": footers.split("\n") if len(footers) > 0 else [],
+      "column_headings": [[str(x) for x in row] for row in rowheaders]
+         if rowheaders is not None else [],
+      "row_headings": [[str(x) for x in row] for row in colheaders]
+         if colheaders is not None else []
+   }
+   metabytes = json.dumps(meta).encode("utf-8")
+   blocks = []
+   with open(path, "wb") as f:
+      f.write(_ARB_MAGIC)
+      f.write(struct.pack("<I", len(metabytes)))
+      f.write(metabytes)
+      for n in range(0, len(rows), rows_per_block):
+         raw = rows[n:n+rows_per_block].tobytes()
+         stored = zlib.compress(raw, level) if level >= 0 else raw
+         blocks.append([f.tell(), len(stored), zlib.crc32(raw)])
+         f.write(stored)
+      indexOffset = f.tell()
+      f.write(json.dumps(blocks).encode("utf-8"))
+      f.write(_ARB_TRAILER.pack(indexOffset, _ARB_MAGIC))
+
+def _read_arb_info(f, path):
+   if f.read(len(_ARB_MAGIC)) != _ARB_MAGIC:
+      raise IOError("'{}' is not an '.arb' file".format(path))
+   (length,) = struct.unpack("<I", f.read(4))
+   meta = json.loads(f.read(length).decode("utf-8"))
+   f.seek(-_ARB_TRAILER.size, os.SEEK_END)
+   trailerStart = f.tell()
+   indexOffset, magic = _ARB_TRAILER.unpack(f.read(_ARB_TRAILER.size))
+   if magic != _ARB_MAGIC:
+      raise IOError("'{}' is truncated: its block index is missing".format(path))
+   f.seek(indexOffset)
+   meta["blocks"] = json.loads(f.read(trailerStart - indexOffset).decode("utf-8"))
+   return meta
+
+def _read_arb_block(f, path, meta, k):
+   offset, length, crc = meta["blocks"][k]
+   f.seek(offset)
+   raw = f.read(length)
+   if meta["compression"] == "zlib":
+      raw = zlib.decompress(raw)
+   if zlib.crc32(raw) != crc:
+      raise IOError("Block {} of '{}' fails its checksum".format(k, path))
+   return raw
+
+def arbinfo(path):
+   with open(path, "rb") as f:
+      return _read_arb_info(f, path)
+
+def readarb_rows(path, start, stop):
+   with open(path, "rb") as f:
+      meta = _read_arb_info(f, path)
+      shape = tuple(meta["shape"])
+      rowshape = shape[1:] if len(shape) > 0 else ()
+      rows = shape[0] if len(shape) > 0 else 1
+      start, stop, ignore = slice(start, stop).indices(rows)
+      stop = max(start, stop)
+      dtype = np.lib.format.descr_to_dtype(meta["dtype"])
+      result = np.empty((stop - start,) + rowshape, dtype=dtype)
+      resultBytes = result.reshape(-1).view(np.uint8)
+      rowbytes = result[0:1].nbytes if stop > start else 0
+      perBlock = meta["rows_per_block"]
+      for k in range(start//perBlock, (stop + perBlock - 1)//perBlock):
+         raw = _read_arb_block(f, path, meta, k)
+         first = max(start, k*perBlock)           # the rows wanted from this block
+         last = min(stop, (k + 1)*perBlock)
+         piece = raw[(first - k*perBlock)*rowbytes:(last - k*perBlock)*rowbytes]
+         resultBytes[(first - start)*rowbytes:(last - start)*rowbytes] = \
+            np.frombuffer(piece, dtype=np.uint8)
+   return result
+
+def readarb(path, options={}):
+   meta = arbinfo(path)
+   shape = tuple(meta["shape"])
+   array = readarb_rows(path, 0, shape[0] if len(shape) > 0 else 1).reshape(shape)
+   if options.get('arbmeta'):
+      return (array, meta, [])
+   if len(meta["column_headings"]) > 0 or len(meta["row_headings"]) > 0:
+      return (array, meta["column_headings"], meta["row_headings"])
+   return (array, [line + "\n" for line in meta["headers"]],
+      [line + "\n" for line in meta["footers"]])
@@ -29,6 +29,12 @@ def _nearest_rotation(v, w):
          pass
    return (best_delta, rotation)
 
+# the options nputils' readers understand; PowerMethod's own, like "workers", stay behind
+_READER_KEYS = ("shape", "dtype", "sep", "rskip", "cskip", "dbgnpu", "mmap", "cache")
+
+def _reader_options(options):
+   return {key: options[key] for key in _READER_KEYS if key in options}
+
 class PowerMethodResult:
    def __init__(self, progress, time):
       self.progress = progress
@@ -75,7 +81,7 @@ class PowerMethodResult:
 class PowerMethodResults:
    def __init__(self, options, path, matrix):
       if not isinstance(matrix, np.ndarray):
-         matrix, column_headings, row_headings = npu.readarray(path, options)
+         matrix, column_headings, row_headings = npu.readarray(path, _reader_options(options))
          #print("matrix has type {} and is\n{}".format(type(matrix), matrix))
       if (len(matrix.shape) != 2) or (matrix.shape[0] != matrix.shape[1]):
          msg = "Expected a square matrix, but got shape {}".format(matrix.shape)
@@ -172,6 +178,8 @@ class PowerMethod:
          'both': False,  # get both left and right eigenvectors
          'all': False,   # use QR to compute all of the eigenvalues
          'dbg': "",      # debugging keys: show debug output for these keys
+         'mmap': "",     # mmap_mode for .npy and .npz inputs: "" reads them into memory
+         'workers': 1,   # read this many paths at a time, before computing anything
       }
 
    def _option(self, name):
@@ -311,6 +319,11 @@ class PowerMethod:
 
       parser.add_a_str("-np_type", "int16", 
          "for random matrices, the NumPy type for an entry")
+      parser.add_a_str("-mmap", DEFAULTS["mmap"],
+         "memory map .npy and .npz inputs in this mode, e.g. r")
+
+      parser.add_an_int("-workers", DEFAULTS["workers"],
+         "read the paths this many at a time before computing")
 
       parser.add_an_optional_list("paths", "path(s) to matrix source file(s)")
 
@@ -330,8 +343,15 @@ argument.  This random matrix will be made symmetric if "-sym" is one of the arg
       paths = options["paths"]
       with dbg.initDbgMgr(low=(options["dbg"] or "")) as dbgmgr:
          if len(paths) > 0:
-            for path in paths:
-               results = pm.compute(path=path)
+            if options["workers"] > 1:
+               matrices = npu.readarrays(paths, _reader_options(options), options["workers"])
+            else:
+               matrices = [None]*len(paths) # each is read by compute
+            for path, matrix in zip(paths, matrices):
+               if isinstance(matrix, Exception):
+                  print("Could not read '{}': {}".format(path, matrix), file=sys.stderr)
+                  continue
+               results = pm.compute(path=path, matrix=None if matrix is None else matrix[0])
                print(str(results))
          else:
             options['max'] = options['max_m']
@@ -351,4 +371,3 @@ argument.  This random matrix will be made symmetric if "-sym" is one of the arg
 if __name__ == '__main__': # we are testing this code from the command line
 
    PowerMethod.fromCmdLine()
-     
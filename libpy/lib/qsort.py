@@ -1,154 +1,684 @@
 
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
 from dbg import getDbgMgr
-from stack import TypedStack
+from functools import cmp_to_key
+import heapq
+from collections import Counter
+from itertools import chain, islice, repeat
 import math
+from multiprocessing.shared_memory import SharedMemory
+import os
+import pickle
+import random
+import shutil
+from stack import TypedStack
+import tempfile
+try:
+   import numpy as np
+except ImportError: # only the code for numpy arrays needs it
+   np = None
 
-def Quicksort(a, *, start=0, stop=None, cmp=None, max_for_insertion = 6, min_for_median=40):
-
-   if cmp is None: # use the native comparison
-      cmp = lambda x, y: 1 if x > y else (-1 if x < y else 0)
-      def medianNear(k): 
-         x = a[k-2]; y = a[k]; z = a[k+2]
-         if x < y:
-            return y if y < z else ( z if x < z else x )                       
-         else:
-            return x if x < z else ( z if y < z else y )
-   else:
-      def medianNear(k):
-         x = a[k-2]; y = a[k]; z = a[k+2]
-         if cmp(x,y) < 0:
-            return y if cmp(y,z) < 0 else ( z if cmp(x,z) < 0 else x )                       
-         else:
-            return x if cmp(x,z) < 0 else ( z if cmp(y,z) < 0 else y )
+def Quicksort(a, *, start=0, stop=None, cmp=None, key=None,
+      max_for_insertion = 6, min_for_median=40, fields=None):
 
+   if _vectorizable(a, cmp, key, fields):
+      return _ndarray_sort(a, start, len(a) if stop is None else stop, fields)
+   if fields is not None:
+      raise ValueError("'fields' needs a structured numpy array and neither 'cmp' nor 'key'")
+   if key is not None:
+      return _keyed_quicksort(a, start, stop, cmp, key, max_for_insertion, min_for_median)
    dbg = getDbgMgr()
+   if not any(dbgKey in dbg for dbgKey in _DEBUG_KEYS): # nobody is watching: skip the checks
+      if cmp is None: # small ints need no comparing at all
+         items = [a[n] for n in range(start, len(a) if stop is None else stop)]
+         values = _int_sorted(items, items, min_for_median)
+         if values is not None:
+            _put_back(a, start, values)
+            return a
+      return _fast_quicksort(a, start, len(a) if stop is None else stop, cmp,
+         max_for_insertion, min_for_median)
+   if cmp is None: # use the native comparison
+      cmp = _native_cmp
    inner_in_dbg = ("inner" in dbg); outer_in_dbg = ("outer" in dbg)
-   move_in_dbg = ("move" in dbg);   swap_in_dbg = ("swap" in dbg)
-   left_in_dbg = ("left" in dbg);   middle_in_dbg = ("middle" in dbg)
-   right_in_dbg = ("right" in dbg)
+   left_in_dbg = ("left" in dbg); middle_in_dbg = ("middle" in dbg)
+   right_in_dbg = ("right" in dbg); stats_in_dbg = ("stats" in dbg)
+   watched = _WatchedList(a, "swap" in dbg or "move" in dbg)
+   comparisons = [0]
+   def watchedCmp(x, y):
+      comparisons[0] += 1
+      if inner_in_dbg: print("compare {0} with {1}".format(x, y))
+      return cmp(x, y)
+   partitionSizes = {} # partitioned subarrays, by their size's bit length
+   insertionSorts = 0; heapsorts = 0
 
    initialRange = range(start, len(a) if stop is None else stop)
    size         = len(initialRange) # "size" is always the length of some subarray of "a"
-   stack        = TypedStack(range, maxlen=size) 
-   stack.push(initialRange)
+   stack        = TypedStack(tuple, maxlen=size) # (subarray range, partition depth) pairs
+   depthLimit   = 2*max(size, 1).bit_length()  # roughly 2*log2(size)
+   stack.push((initialRange, 0))
    while stack.size > 0:
       # quicksort is tail recursive: this outer loop tracks the remaining work
-      currentRange = stack.pop()
+      currentRange, depth = stack.pop()
       start = currentRange.start; stop = currentRange.stop; size = len(currentRange)
       if size <= max_for_insertion: # insertion sort: faster once size is around 8 or so?
+         insertionSorts += 1
+         _insertion_sort(watched, start, stop, watchedCmp)
+      elif depth > depthLimit: # the partitions have been lopsided: give up on quicksort here
+         if outer_in_dbg:
+            print("depth {0} > {1}: heapsort [{2}:{3}]".format(depth, depthLimit, start, stop))
+         _heapsort(watched, start, stop, watchedCmp)
+         heapsorts += 1
+      else:
+         partitionSizes[size.bit_length()] = partitionSizes.get(size.bit_length(), 0) + 1
+         if outer_in_dbg:
+            msg = "########### start={0}, stop={1} count={2} ###########"
+            print(msg.format(start, stop, stop-start))
+         lessStop, greaterStart = _partition(watched, start, stop, watchedCmp, min_for_median)
+         if middle_in_dbg or outer_in_dbg:
+            msg = "less [{0}:{1}], equal [{1}:{2}], greater [{2}:{3}]"
+            print(msg.format(start, lessStop, greaterStart, stop))
+         if left_in_dbg: print("less: {0}".format([a[n] for n in range(start, lessStop)]))
+         if right_in_dbg: print("greater: {0}".format([a[n] for n in range(greaterStart, stop)]))
+         if lessStop - start > 1: stack.push((range(start, lessStop), depth+1))
+         if stop - greaterStart > 1: stack.push((range(greaterStart, stop), depth+1))
+   if outer_in_dbg or stats_in_dbg:
+      msg = "Quicksort [{0}:{1}]: {2} partitions, {3} comparisons, {4} writes, " + \
+         "{5} insertion sorts, {6} heapsorts"
+      print(msg.format(initialRange.start, initialRange.stop, sum(partitionSizes.values()),
+         comparisons[0], watched.writes, insertionSorts, heapsorts))
+      for bits in sorted(partitionSizes):
+         print("   partitioned sizes {0}-{1}: {2}".format(1 << (bits-1), (1 << bits) - 1,
+            partitionSizes[bits]))
+   return a
+
+_DEBUG_KEYS = ("inner", "outer", "move", "swap", "left", "middle", "right", "stats")
+
+class _WatchedList(object):
+   """ stands in for the array being sorted when debugging is on: it counts the writes and, if
+   asked to, prints them """
+   def __init__(self, a, show):
+      self.a = a
+      self.show = show
+      self.writes = 0
+   def __getitem__(self, n):
+      return self.a[n]
+   def __setitem__(self, n, value):
+      self.writes += 1
+      if self.show: print("a[{0}] <- {1}".format(n, value))
+      self.a[n] = value
+
+def _insertion_sort(a, start, stop, cmp):
+   for i in range(start+1, stop):
+      a_i = a[i]
+      j = i - 1 # eventually j is the first element before i-th with a[i] <= a[j]
+      while j>=start and cmp(a_i, a[j]) < 0:
+         a[j+1] = a[j] # shift right to make room for a_i
+         j -= 1
+      # j==start-1 or a[i] >= a[j]
+      a[j+1] = a_i
+
+def _fast_quicksort(a, start, stop, cmp, max_for_insertion, min_for_median, carry=None):
+   # Quicksort's loop with no debugging checks at all, comparing natively if cmp is None.  If
+   # "carry" is not None (which needs cmp to be None), every move in "a" is made in it as well.
+   size = stop - start
+   stack = TypedStack(tuple, maxlen=max(size, 1))
+   depthLimit = 2*max(size, 1).bit_length()
+   stack.push((range(start, stop), 0))
+   while stack.size > 0:
+      currentRange, depth = stack.pop()
+      start = currentRange.start; stop = currentRange.stop; size = stop - start
+      if size <= max_for_insertion:
+         if cmp is not None:
+            _insertion_sort(a, start, stop, cmp)
+            continue
          for i in range(start+1, stop):
             a_i = a[i]
-            j = i - 1 # eventually j is the first element before i-th with a[i] <= a[j]
-            while j>=start and cmp(a_i, a[j]) < 0: 
-               a[j+1] = a[j] # shift right to make room for a_i
+            j = i - 1
+            while j>=start and a_i < a[j]:
+               a[j+1] = a[j]
                j -= 1
-            # j==start-1 or a[i] >= a[j]
             a[j+1] = a_i
+            if carry is not None and j+1 < i:
+               carry[j+1:i+1] = [carry[i]] + carry[j+1:i]
+      elif depth > depthLimit:
+         _heapsort(a, start, stop, cmp, carry)
       else:
-         middle = start+ size//2
-         if size<=min_for_median: partitionValue = a[middle]
+         if cmp is None:
+            lessStop, greaterStart = _native_partition(a, start, stop, min_for_median, carry)
          else:
-            last = stop-1
-            left = medianNear(start+2); middle = medianNear(middle); right = medianNear(last-2)
-            # median of the medians near the start, middle, and end of the segment:
-            if cmp(left,middle) < 0:
-               if cmp(middle,right) < 0: partitionValue = middle
-               elif cmp(left,right) < 0: partitionValue = right
-               else: partitionValue = left                    
-            else:
-               if cmp(left,right) < 0: partitionValue = left
-               elif cmp(middle,right) < 0: partitionValue = right
-               else: partitionValue = middle
-         firstLessOnLeft     = start       # first index that MIGHT have a value < partition
-         nextLeft            = firstLessOnLeft # the next entry on the left to look at
-         lastOnRight         = stop - 1    # last valid index to the right of the partition
-         firstGreaterOnRight = lastOnRight # where the first > partition might be
-         nextRight           = lastOnRight # the first index on the right to check
-         if outer_in_dbg:
-            msg = "########### start={0}, stop={1} count={2} ###########"
-            print(msg.format(start, stop, stop-start))
-         while True:     
-            while nextLeft <= nextRight: # work in from the left
-               nextLeftRelMedian = cmp(a[nextLeft], partitionValue)
-               if middle_in_dbg:
-                  print("left {0}: {1}>{2}?".format(nextLeft,a[nextLeft],partitionValue))
-               if nextLeftRelMedian > 0: 
-                  if inner_in_dbg: print("left breaking nl={0}".format(nextLeft)) 
-                  break
-               elif nextLeftRelMedian is 0: # push the partition value to the left end
-                  temp = a[firstLessOnLeft]
-                  if inner_in_dbg:
-                     msg = "left: swap {0} at {1} for {2} at {3}"
-                     print(msg.format(temp,firstLessOnLeft,a[nextLeft],nextLeft))
-                  a[firstLessOnLeft] = a[nextLeft]
-                  a[nextLeft] = temp
-                  firstLessOnLeft += 1
-               nextLeft += 1
-            while(nextLeft <= nextRight): # work in from the right
-               nextRightRelMedian = cmp(a[nextRight], partitionValue)
-               if inner_in_dbg:
-                  msg = "right {0}: {1}<{2}?"
-                  print(msg.format(nextRight,a[nextRight],partitionValue))
-               if nextRightRelMedian < 0:
-                  if inner_in_dbg: print("right breaking nr={0}".format(nextRight)) 
-                  break
-               elif nextRightRelMedian is 0: # push the partition value to the right end
-                  temp = a[firstGreaterOnRight]
-                  if inner_in_dbg:
-                     msg = "right: swap {0} at {1} for {2} at {3}"
-                     print(msg.format(temp,firstGreaterOnRight, a[nextRight],nextRight))
-                  a[firstGreaterOnRight] = a[nextRight]
-                  a[nextRight] = temp
-                  firstGreaterOnRight -= 1
-               nextRight -= 1
-            if nextLeft > nextRight:
-               if middle_in_dbg: 
-                  print("breaking nl={0}>nr={1}".format(nextLeft, nextRight)) 
-               break
-            temp = a[nextRight]
-            if swap_in_dbg:
-               msg = "value swap {0} at {1} for {2} at {3}"
-               print(msg.format(temp,nextRight,a[nextLeft],nextLeft))
-            a[nextRight] = a[nextLeft]
-            a[nextLeft] = temp
-            nextLeft += 1
-            nextRight -= 1
-            if middle_in_dbg:
-               print("end while true: a="+str(a))
-               msg = "{0}<{1}<{2}<{3}"
-               print(msg.format(firstLessOnLeft,nextLeft,nextRight,firstGreaterOnRight))
-         if outer_in_dbg:
-            print("pv="+str(partitionValue)+" and a before swap="+str(a))
-            print("[{0}:{1}:{2}] min({3},{4})".format(
-               start, firstLessOnLeft,nextLeft,firstLessOnLeft-start,
-               nextLeft-firstLessOnLeft))
-            print("[{0}:{1}:{2}] min({3},{4})".format(
-               nextRight, firstGreaterOnRight,lastOnRight,firstGreaterOnRight-nextRight,
-               lastOnRight-firstGreaterOnRight))
-         # move all the partition value entries to the middle
-         valuesToMoveOnLeft = min(firstLessOnLeft-start, nextLeft-firstLessOnLeft)
-         if valuesToMoveOnLeft > 0:
-            firstPV = nextLeft - 1
-            for i in range(0, valuesToMoveOnLeft):
-               if move_in_dbg: 
-                  print("{0}=s+i and {1}=fpv-i".format(start+i, firstPV-i))
-               a[start+i]    = a[firstPV-i]
-               a[firstPV-i] = partitionValue
-         valuesToMoveOnRight = min(firstGreaterOnRight-nextRight,
-                  lastOnRight-firstGreaterOnRight)
-         if valuesToMoveOnRight > 0:
-            firstPV = nextRight + 1
-            for i in range(0, valuesToMoveOnRight):
-               if move_in_dbg:
-                  print("{0}=lr-i and {1}=fpv+i".format(lastOnRight-i, firstPV+i))
-               a[lastOnRight-i] = a[firstPV+i]
-               a[firstPV+i] = partitionValue
-         leftSize  = nextLeft - firstLessOnLeft
-         rightSize = firstGreaterOnRight - nextRight
-         if leftSize > 1: stack.push(range(start, start+leftSize))
-         if rightSize > 1: stack.push(range(stop-rightSize, stop))
+            lessStop, greaterStart = _partition(a, start, stop, cmp, min_for_median)
+         if lessStop - start > 1: stack.push((range(start, lessStop), depth+1))
+         if stop - greaterStart > 1: stack.push((range(greaterStart, stop), depth+1))
    return a
 
 
 Quicksort.debug = lambda commaSeparatedKeys: getDbgMgr(commaSeparatedKeys)
-Quicksort.debugkeys = lambda: ["inner", "left", "middle", "move", "outer", "right", "swap"]
+Quicksort.debugkeys = lambda: sorted(_DEBUG_KEYS)
+
+def _keyed_quicksort(a, start, stop, cmp, key, max_for_insertion, min_for_median):
+   stop = len(a) if stop is None else stop
+   if cmp is None:
+      keys = [key(a[n]) for n in range(start, stop)]
+      order = list(range(start, stop))
+      sortedOrder = _int_sorted(order, keys, min_for_median)
+      if sortedOrder is not None: order = sortedOrder
+      else: _fast_quicksort(keys, 0, len(keys), None, max_for_insertion, min_for_median, order)
+   else: # compare the keys, and let the indices break ties
+      keyed = [(key(a[n]), n) for n in range(start, stop)]
+      keycmp = lambda x, y: cmp(x[0], y[0]) or (x[1] - y[1])
+      Quicksort(keyed, cmp=keycmp,
+         max_for_insertion=max_for_insertion, min_for_median=min_for_median)
+      order = [pair[1] for pair in keyed]
+   values = [a[n] for n in order]
+   for n in range(0, len(values)):
+      a[start+n] = values[n]
+   return a
+
+def _vectorizable(a, cmp, key, fields):
+   if np is None or not isinstance(a, np.ndarray) or a.ndim != 1:
+      return False
+   if cmp is not None or key is not None:
+      return False
+   if a.dtype.names is not None:
+      return True
+   return fields is None and a.dtype.kind in "biufUS"
+
+def _ndarray_sort(a, start, stop, fields):
+   segment = a[start:stop]
+   if a.dtype.names is None:
+      segment.sort()
+      return a
+   if fields is None: fields = a.dtype.names
+   elif isinstance(fields, str): fields = [fields]
+   # np.lexsort takes the most significant key last
+   segment[:] = segment[np.lexsort([segment[field] for field in reversed(list(fields))])]
+   return a
+
+def _heapsort(a, start, stop, cmp, carry=None):
+   # sorts a[start:stop] in place, using cmp if it is not None and "<" otherwise.  If "carry"
+   # is not None, every move made in "a" is made in "carry" as well.
+   less = (lambda x, y: x < y) if cmp is None else (lambda x, y: cmp(x, y) < 0)
+   def swap(i, j):
+      a[i], a[j] = a[j], a[i]
+      if carry is not None: carry[i], carry[j] = carry[j], carry[i]
+   def siftDown(root, end): # root and end are relative to start; end is exclusive
+      while True:
+         child = 2*root + 1
+         if child >= end: return
+         if child+1 < end and less(a[start+child], a[start+child+1]): child += 1
+         if not less(a[start+root], a[start+child]): return
+         swap(start+root, start+child)
+         root = child
+   size = stop - start
+   for root in range(size//2 - 1, -1, -1):
+      siftDown(root, size)
+   for end in range(size-1, 0, -1):
+      swap(start, start+end)
+      siftDown(0, end)
+
+def select(a, k, *, start=0, stop=None, cmp=None, key=None):
+   nth_element(a, k, start=start, stop=stop, cmp=cmp, key=key)
+   return a[k]
+
+def nth_element(a, k, *, start=0, stop=None, cmp=None, key=None):
+   stop = len(a) if stop is None else stop
+   if not start <= k < stop:
+      raise IndexError("{0} is not in [{1}:{2}]".format(k, start, stop))
+   if key is not None:
+      keyed, keycmp = _decorate(a, start, stop, cmp, key)
+      _select(keyed, k-start, 0, len(keyed), keycmp)
+      _undecorate(a, start, keyed)
+   else:
+      _select(a, k, start, stop, _native_cmp if cmp is None else cmp)
+   return a
+
+def partial_sort(a, k, *, start=0, stop=None, cmp=None, key=None):
+   stop = len(a) if stop is None else stop
+   k = max(0, min(k, stop-start))
+   if k == 0: return a
+   if key is not None:
+      keyed, keycmp = _decorate(a, start, stop, cmp, key)
+      if k < len(keyed): _select(keyed, k-1, 0, len(keyed), keycmp)
+      Quicksort(keyed, stop=k, cmp=keycmp)
+      _undecorate(a, start, keyed)
+   else:
+      cmp = _native_cmp if cmp is None else cmp
+      if k < stop-start: _select(a, start+k-1, start, stop, cmp)
+      Quicksort(a, start=start, stop=start+k, cmp=cmp)
+   return a
+
+def topk(a, k, *, start=0, stop=None, cmp=None, key=None, largest=True):
+   stop = len(a) if stop is None else stop
+   b = a[start:stop] if isinstance(a, list) else [a[n] for n in range(start, stop)]
+   if largest:
+      forward = _native_cmp if cmp is None else cmp
+      cmp = lambda x, y: forward(y, x)
+   partial_sort(b, k, cmp=cmp, key=key)
+   del b[max(0, k):]
+   return b
+
+def _native_cmp(x, y):
+   return 1 if x > y else (-1 if x < y else 0)
+
+def _decorate(a, start, stop, cmp, key):
+   # pairs each key with its index, so that no two pairs are equal
+   keyed = [(key(a[n]), n) for n in range(start, stop)]
+   if cmp is None:
+      keycmp = lambda x, y: (1 if x[0] > y[0] else (-1 if x[0] < y[0] else x[1] - y[1]))
+   else:
+      keycmp = lambda x, y: cmp(x[0], y[0]) or (x[1] - y[1])
+   return keyed, keycmp
+
+def _undecorate(a, start, keyed):
+   values = [a[pair[1]] for pair in keyed]
+   for n in range(0, len(values)):
+      a[start+n] = values[n]
+
+def _select(a, k, start, stop, cmp, min_for_median=40):
+   # narrows [start:stop] down to the partition around a[k]
+   depthLimit = 2*max(stop-start, 1).bit_length()
+   depth = 0
+   while stop - start > 1:
+      if depth > depthLimit:
+         _heapsort(a, start, stop, cmp)
+         return
+      lessStop, greaterStart = _partition(a, start, stop, cmp, min_for_median)
+      if k < lessStop: stop = lessStop
+      elif k >= greaterStart: start = greaterStart
+      else: return
+      depth += 1
+
+def _partition(a, start, stop, cmp, min_for_median=40):
+   # Quicksort's three-way partition of a[start:stop], without the debugging output.  Returns
+   # (lessStop, greaterStart): a[start:lessStop] < the partition value, a[greaterStart:stop] >
+   # it, and everything in between equals it.
+   size = stop - start
+   if size <= min_for_median: partitionValue = a[start + size//2]
+   else:
+      def medianNear(k):
+         x = a[k-2]; y = a[k]; z = a[k+2]
+         if cmp(x,y) < 0:
+            return y if cmp(y,z) < 0 else ( z if cmp(x,z) < 0 else x )
+         else:
+            return x if cmp(x,z) < 0 else ( z if cmp(y,z) < 0 else y )
+      left = medianNear(start+2); middle = medianNear(start + size//2); right = medianNear(stop-3)
+      if cmp(left,middle) < 0:
+         if cmp(middle,right) < 0: partitionValue = middle
+         elif cmp(left,right) < 0: partitionValue = right
+         else: partitionValue = left
+      else:
+         if cmp(left,right) < 0: partitionValue = left
+         elif cmp(middle,right) < 0: partitionValue = right
+         else: partitionValue = middle
+   firstLessOnLeft = nextLeft = start
+   lastOnRight = firstGreaterOnRight = nextRight = stop - 1
+   while True:
+      while nextLeft <= nextRight:
+         c = cmp(a[nextLeft], partitionValue)
+         if c > 0: break
+         elif c == 0:
+            a[nextLeft], a[firstLessOnLeft] = a[firstLessOnLeft], a[nextLeft]
+            firstLessOnLeft += 1
+         nextLeft += 1
+      while nextLeft <= nextRight:
+         c = cmp(a[nextRight], partitionValue)
+         if c < 0: break
+         elif c == 0:
+            a[nextRight], a[firstGreaterOnRight] = a[firstGreaterOnRight], a[nextRight]
+            firstGreaterOnRight -= 1
+         nextRight -= 1
+      if nextLeft > nextRight: break
+      a[nextLeft], a[nextRight] = a[nextRight], a[nextLeft]
+      nextLeft += 1
+      nextRight -= 1
+   _gather_equal(a, start, stop, firstLessOnLeft, nextLeft, nextRight, firstGreaterOnRight)
+   return start + (nextLeft - firstLessOnLeft), stop - (firstGreaterOnRight - nextRight)
+
+def _native_partition(a, start, stop, min_for_median=40, carry=None):
+   # _partition with "<", ">" and "==" in place of cmp.  If "carry" is not None, every move
+   # made in "a" is made in "carry" as well.
+   size = stop - start
+   if size <= min_for_median: partitionValue = a[start + size//2]
+   else:
+      def medianNear(k):
+         x = a[k-2]; y = a[k]; z = a[k+2]
+         if x < y:
+            return y if y < z else ( z if x < z else x )
+         else:
+            return x if x < z else ( z if y < z else y )
+      left = medianNear(start+2); middle = medianNear(start + size//2); right = medianNear(stop-3)
+      if left < middle:
+         if middle < right: partitionValue = middle
+         elif left < right: partitionValue = right
+         else: partitionValue = left
+      else:
+         if left < right: partitionValue = left
+         elif middle < right: partitionValue = right
+         else: partitionValue = middle
+   firstLessOnLeft = nextLeft = start
+   lastOnRight = firstGreaterOnRight = nextRight = stop - 1
+   while True:
+      while nextLeft <= nextRight:
+         x = a[nextLeft]
+         if x > partitionValue: break
+         elif x == partitionValue:
+            a[nextLeft] = a[firstLessOnLeft]; a[firstLessOnLeft] = x
+            if carry is not None:
+               carry[nextLeft], carry[firstLessOnLeft] = carry[firstLessOnLeft], carry[nextLeft]
+            firstLessOnLeft += 1
+         nextLeft += 1
+      while nextLeft <= nextRight:
+         x = a[nextRight]
+         if x < partitionValue: break
+         elif x == partitionValue:
+            a[nextRight] = a[firstGreaterOnRight]; a[firstGreaterOnRight] = x
+            if carry is not None:
+               carry[nextRight], carry[firstGreaterOnRight] = \
+                  carry[firstGreaterOnRight], carry[nextRight]
+            firstGreaterOnRight -= 1
+         nextRight -= 1
+      if nextLeft > nextRight: break
+      a[nextLeft], a[nextRight] = a[nextRight], a[nextLeft]
+      if carry is not None:
+         carry[nextLeft], carry[nextRight] = carry[nextRight], carry[nextLeft]
+      nextLeft += 1
+      nextRight -= 1
+   _gather_equal(a, start, stop, firstLessOnLeft, nextLeft, nextRight, firstGreaterOnRight)
+   if carry is not None:
+      _gather_equal(carry, start, stop, firstLessOnLeft, nextLeft, nextRight, firstGreaterOnRight)
+   return start + (nextLeft - firstLessOnLeft), stop - (firstGreaterOnRight - nextRight)
+
+def _gather_equal(a, start, stop, firstLessOnLeft, nextLeft, nextRight, firstGreaterOnRight):
+   # moves the entries equal to the partition value from the two ends to the middle
+   lastOnRight = stop - 1
+   firstPV = nextLeft - 1
+   for i in range(0, min(firstLessOnLeft-start, nextLeft-firstLessOnLeft)):
+      a[start+i], a[firstPV-i] = a[firstPV-i], a[start+i]
+   firstPV = nextRight + 1
+   for i in range(0, min(firstGreaterOnRight-nextRight, lastOnRight-firstGreaterOnRight)):
+      a[lastOnRight-i], a[firstPV+i] = a[firstPV+i], a[lastOnRight-i]
+
+def parallel_sort(a, *, workers=None, start=0, stop=None, cmp=None, key=None,
+      kernel="quicksort", oversample=32, min_parallel=10000):
+   if kernel not in ("quicksort", "builtin"):
+      raise ValueError("unknown kernel '{0}'".format(kernel))
+   stop = len(a) if stop is None else stop
+   workers = (os.cpu_count() or 1) if workers is None else workers
+   size = stop - start
+   if workers < 2 or size < max(min_parallel, 2*workers):
+      if np is not None and isinstance(a, np.ndarray) and cmp is None and key is None:
+         _sort_bucket_in_place(a[start:stop], kernel)
+      else:
+         sortedItems = _sort_bucket([a[n] for n in range(start, stop)], cmp, key, kernel)
+         for n in range(0, size):
+            a[start+n] = sortedItems[n]
+      return a
+   if (np is not None and isinstance(a, np.ndarray) and a.ndim == 1 and a.dtype.kind in "biuf"
+         and cmp is None and key is None):
+      return _parallel_sort_shared(a, start, stop, workers, kernel, oversample)
+   items = [a[n] for n in range(start, stop)]
+   keys = items if key is None else [key(x) for x in items]
+   if cmp is not None: # bisect needs "<", and cmp_to_key supplies it
+      wrap = cmp_to_key(cmp)
+      keys = [wrap(k) for k in keys]
+   sample = [keys[n] for n in random.sample(range(0, size), min(size, workers*oversample))]
+   sample.sort()
+   step = len(sample)/workers
+   splitters = [sample[int(step*n)] for n in range(1, workers)]
+   buckets = [[] for n in range(0, workers)]
+   for n in range(0, size):
+      buckets[bisect_right(splitters, keys[n])].append(items[n])
+   del items, keys
+   with ProcessPoolExecutor(max_workers=workers) as pool:
+      n = start
+      for sortedBucket in pool.map(_sort_bucket, buckets, repeat(cmp), repeat(key), repeat(kernel)):
+         for x in sortedBucket:
+            a[n] = x
+            n += 1
+   return a
+
+def _parallel_sort_shared(a, start, stop, workers, kernel, oversample):
+   view = a[start:stop]
+   sample = np.sort(view[np.random.randint(0, len(view), size=workers*oversample)])
+   splitters = sample[oversample::oversample][:workers-1]
+   bucketOf = np.searchsorted(splitters, view, side="right")
+   bounds = np.concatenate(([0], np.cumsum(np.bincount(bucketOf, minlength=workers))))
+   shm = SharedMemory(create=True, size=max(1, view.nbytes))
+   try:
+      shared = np.ndarray(view.shape, dtype=view.dtype, buffer=shm.buf)
+      shared[:] = view[np.argsort(bucketOf, kind="stable")] # laid out bucket by bucket
+      with ProcessPoolExecutor(max_workers=workers) as pool:
+         list(pool.map(_sort_shared_bucket, repeat(shm.name), repeat(view.dtype.str),
+            repeat(len(view)), bounds[:-1].tolist(), bounds[1:].tolist(), repeat(kernel)))
+      view[:] = shared
+      del shared # the buffer cannot be released while an array still uses it
+   finally:
+      shm.close()
+      shm.unlink()
+   return a
+
+def _sort_bucket(bucket, cmp, key, kernel):
+   if kernel == "quicksort":
+      return Quicksort(bucket, cmp=cmp, key=key)
+   if cmp is None:
+      bucket.sort(key=key)
+   else:
+      wrap = cmp_to_key(cmp)
+      bucket.sort(key=wrap if key is None else (lambda x: wrap(key(x))))
+   return bucket
+
+def _sort_bucket_in_place(bucket, kernel):
+   if kernel == "quicksort": Quicksort(bucket)
+   else: bucket.sort()
+
+def _sort_shared_bucket(name, dtype, length, lo, hi, kernel):
+   # the pool's processes share their parent's resource tracker, which the parent's unlink
+   # settles, so there is nothing to unregister here
+   shm = SharedMemory(name=name)
+   try:
+      bucket = np.ndarray((length,), dtype=dtype, buffer=shm.buf)[lo:hi]
+      _sort_bucket_in_place(bucket, kernel)
+      del bucket
+   finally:
+      shm.close()
+
+def external_sort(items, *, cmp=None, key=None, max_in_memory=1000*1000, fanin=16,
+      format="pickle", buffersize=64*1024, scratchdir=None):
+   if format not in _RUN_FORMATS:
+      raise ValueError("unknown run format '{0}'".format(format))
+   if fanin < 2:
+      raise ValueError("the fan-in must be at least 2, not {0}".format(fanin))
+   items = iter(items)
+   if format == "text": items = (line[:-1] if line.endswith("\n") else line for line in items)
+   chunk = list(islice(items, max_in_memory))
+   Quicksort(chunk, cmp=cmp, key=key)
+   if len(chunk) < max_in_memory: # it all fit in memory
+      return iter(chunk)
+   return _external_merge(chunk, items, cmp, key, max_in_memory, fanin, format, buffersize,
+      scratchdir)
+
+def _external_merge(chunk, items, cmp, key, max_in_memory, fanin, format, buffersize, scratchdir):
+   write, read = _RUN_FORMATS[format]
+   mergekey = key
+   if cmp is not None:
+      wrap = cmp_to_key(cmp)
+      mergekey = wrap if key is None else (lambda x: wrap(key(x)))
+   scratch = tempfile.mkdtemp(prefix="qsort-", dir=scratchdir)
+   try:
+      runs = []
+      runCount = 0
+      def newRun():
+         nonlocal runCount
+         runCount += 1
+         return os.path.join(scratch, "run{0}".format(runCount))
+      while len(chunk) > 0:
+         runs.append(newRun())
+         write(runs[-1], chunk, buffersize)
+         chunk = list(islice(items, max_in_memory))
+         Quicksort(chunk, cmp=cmp, key=key)
+      del chunk
+      while len(runs) > fanin: # one more pass, merging fanin runs at a time
+         merged = []
+         for n in range(0, len(runs), fanin):
+            group = runs[n:n+fanin]
+            merged.append(newRun())
+            write(merged[-1], heapq.merge(*[read(run, buffersize) for run in group],
+               key=mergekey), buffersize)
+            for run in group: os.remove(run)
+         runs = merged
+      yield from heapq.merge(*[read(run, buffersize) for run in runs], key=mergekey)
+   finally:
+      shutil.rmtree(scratch, ignore_errors=True)
+
+def _write_pickled_run(path, records, buffersize):
+   with open(path, "wb", buffering=buffersize) as run:
+      for record in records:
+         pickle.dump(record, run, pickle.HIGHEST_PROTOCOL)
+
+def _read_pickled_run(path, buffersize):
+   with open(path, "rb", buffering=buffersize) as run:
+      while True:
+         try:
+            yield pickle.load(run)
+         except EOFError:
+            return
+
+def _write_npy_run(path, records, buffersize):
+   if isinstance(records, list):
+      with open(path, "wb") as run: # np.save would add ".npy" to a bare path
+         np.save(run, np.asarray(records))
+      return
+   # a merge: the length and type of the whole run are not known until the end, so the blocks
+   # go to a raw file first, and are copied into the run once they are
+   blocks = []
+   with open(path + ".raw", "wb") as raw:
+      while True:
+         block = np.asarray(list(islice(records, buffersize)))
+         if len(block) == 0: break
+         block.tofile(raw)
+         blocks.append((block.dtype, len(block)))
+   dtype = np.result_type(*[block[0] for block in blocks]) if blocks else float
+   run = np.lib.format.open_memmap(path, mode="w+", dtype=dtype,
+      shape=(sum(block[1] for block in blocks),))
+   with open(path + ".raw", "rb") as raw:
+      n = 0
+      for blockType, count in blocks:
+         run[n:n+count] = np.fromfile(raw, dtype=blockType, count=count)
+         n += count
+   run.flush()
+   del run
+   os.remove(path + ".raw")
+
+def _read_npy_run(path, buffersize):
+   run = np.load(path, mmap_mode="r")
+   for n in range(0, len(run), buffersize):
+      yield from run[n:n+buffersize].tolist()
+
+def _write_text_run(path, records, buffersize):
+   with open(path, "w", buffering=buffersize) as run:
+      for record in records:
+         run.write(record)
+         run.write("\n")
+
+def _read_text_run(path, buffersize):
+   with open(path, "r", buffering=buffersize) as run:
+      for line in run:
+         yield line[:-1]
+
+_RUN_FORMATS = {
+   "pickle": (_write_pickled_run, _read_pickled_run),
+   "npy": (_write_npy_run, _read_npy_run),
+   "text": (_write_text_run, _read_text_run)
+}
+
+def counting_sort(a, *, start=0, stop=None, key=None):
+   stop = len(a) if stop is None else stop
+   items = [a[n] for n in range(start, stop)]
+   keys = items if key is None else [key(x) for x in items]
+   if len(keys) > 0:
+      _put_back(a, start, _counting_sorted(items, keys, min(keys), max(keys), key is None))
+   return a
+
+def radix_sort(a, *, start=0, stop=None, key=None, bits=None, digit_bits=None):
+   stop = len(a) if stop is None else stop
+   items = [a[n] for n in range(start, stop)]
+   keys = items if key is None else [key(x) for x in items]
+   if len(keys) == 0: return a
+   if isinstance(keys[0], (str, bytes)):
+      order = _string_radix_order(keys)
+   else:
+      lo = min(keys)
+      bits = (max(keys) - lo).bit_length() if bits is None else bits
+      if digit_bits is None: digit_bits = _radix_digit_bits(len(keys))
+      order = _int_radix_order(keys, lo, bits, digit_bits)
+   _put_back(a, start, [items[n] for n in order])
+   return a
+
+_COUNTING_SPAN_PER_KEY = 4 # counting_sort when the keys' range is no more than this per key
+_MAX_RADIX_BITS = 32       # radix_sort when the keys' range needs no more bits than this
+_MIN_RADIX_KEYS = 64       # ... and there are at least this many keys
+
+def _radix_digit_bits(n):
+   # each pass costs about n plus the number of buckets, so the buckets should number about n/4
+   return max(4, min(16, n.bit_length() - 2))
+
+def _int_sorted(items, keys, min_for_median):
+   # the items sorted by counting_sort or radix_sort, if the keys are ints that suit one of
+   # them, and otherwise None
+   if len(keys) <= min_for_median or not all(type(k) is int for k in keys):
+      return None
+   lo = min(keys); hi = max(keys)
+   if hi - lo < _COUNTING_SPAN_PER_KEY*len(keys):
+      return _counting_sorted(items, keys, lo, hi, items is keys)
+   if (hi - lo).bit_length() <= _MAX_RADIX_BITS and len(keys) >= _MIN_RADIX_KEYS:
+      order = _int_radix_order(keys, lo, (hi - lo).bit_length(), _radix_digit_bits(len(keys)))
+      return [items[n] for n in order]
+   return None
+
+def _counting_sorted(items, keys, lo, hi, keysAreItems):
+   if keysAreItems: # there is nothing to carry along: just count
+      counts = Counter(keys)
+      values = []
+      for k in range(lo, hi+1):
+         count = counts.get(k)
+         if count is not None: values += [k]*count
+      return values
+   buckets = [[] for k in range(lo, hi+1)]
+   for n in range(0, len(keys)):
+      buckets[keys[n]-lo].append(items[n])
+   return list(chain.from_iterable(buckets))
+
+def _int_radix_order(keys, lo, bits, digit_bits):
+   # the indices of the keys in stable sorted order
+   order = range(0, len(keys))
+   mask = (1 << digit_bits) - 1
+   if lo != 0: keys = [k - lo for k in keys]
+   for shift in range(0, max(bits, 1), digit_bits):
+      buckets = [[] for n in range(0, mask+1)]
+      for n in order:
+         buckets[(keys[n] >> shift) & mask].append(n)
+      order = list(chain.from_iterable(buckets))
+   return list(order)
+
+def _string_radix_order(keys):
+   width = max(len(k) for k in keys)
+   isBytes = isinstance(keys[0], bytes)
+   largest = max(max(k) if isBytes else max(map(ord, k)) for k in keys if len(k) > 0) \
+      if width > 0 else 0
+   order = range(0, len(keys))
+   for position in range(width-1, -1, -1):
+      buckets = [[] for n in range(0, largest+2)] # bucket 0 is for keys too short to reach
+      for n in order:
+         k = keys[n]
+         if position >= len(k): buckets[0].append(n)
+         else: buckets[(k[position] if isBytes else ord(k[position])) + 1].append(n)
+      order = list(chain.from_iterable(buckets))
+   return list(order)
+
+def _put_back(a, start, values):
+   if isinstance(a, list):
+      a[start:start+len(values)] = values
+   else:
+      for n in range(0, len(values)):
+         a[start+n] = values[n]
@@ -0,0 +1,164 @@
+
+import cmdlineparser as clp
+from functools import cmp_to_key
+import json
+import math
+import platform
+from qsort import Quicksort
+from random import Random
+from sortedlist import SortedList
+import sys
+from time import perf_counter, strftime
+
+
+def _organ_pipe(n, rng):
+   return list(range(0, n//2)) + list(range(n - n//2 - 1, -1, -1))
+
+def _few_unique(n, rng):
+   values = [rng.randrange(0, n+1) for k in range(0, 8)]
+   return [rng.choice(values) for k in range(0, n)]
+
+def _sawtooth(n, rng):
+   tooth = max(1, math.isqrt(n))
+   return [k % tooth for k in range(0, n)]
+
+FAMILIES = {
+   "random":     lambda n, rng: [rng.randrange(0, n) for k in range(0, n)],
+   "sorted":     lambda n, rng: list(range(0, n)),
+   "reversed":   lambda n, rng: list(range(n, 0, -1)),
+   "organ-pipe": _organ_pipe,
+   "few-unique": _few_unique,
+   "sawtooth":   _sawtooth,
+   "all-equal":  lambda n, rng: [7]*n
+}
+
+def _native(x, y):
+   return 1 if x > y else (-1 if x < y else 0)
+
+def _negated(x):
+   return -x
+
+def _quicksort(data, mode):
+   if mode == "native": Quicksort(data)
+   elif mode == "cmp": Quicksort(data, cmp=_native)
+   else: Quicksort(data, key=_negated)
+   return data
+
+def _sortedlist(data, mode):
+   if mode == "native": return SortedList(data)
+   return SortedList(data, cmp_to_key(_native) if mode == "cmp" else _negated)
+
+def _sorted(data, mode):
+   if mode == "native": return sorted(data)
+   return sorted(data, key=cmp_to_key(_native) if mode == "cmp" else _negated)
+
+SORTERS = {"Quicksort": _quicksort, "SortedList": _sortedlist, "sorted": _sorted}
+MODES = ("native", "cmp", "key")
+
+class SortBench:
+
+   def getOptionDefaults():
+      return dict(sizes="1e3,1e4,1e5", families=",".join(FAMILIES), sorters=",".join(SORTERS),
+         modes=",".join(MODES), repeat=3, seed=31416, floats=False, out="", compare="",
+         tolerance=0.25)
+
+   def __init__(self, options={}):
+      self.options = SortBench.getOptionDefaults()
+      self.options.update(options)
+      self.sizes = [int(float(size)) for size in self._names("sizes")]
+      self.families = self._names("families", "family", FAMILIES)
+      self.sorters = self._names("sorters", "sorter", SORTERS)
+      self.modes = self._names("modes", "mode", MODES)
+
+   def _names(self, option, what=None, known=None):
+      names = [name.strip() for name in str(self.options[option]).split(",") if name.strip()]
+      if known is not None:
+         for name in names:
+            if name not in known:
+               msg = "unknown {0} '{1}': the choices are {2}"
+               raise ValueError(msg.format(what, name, ", ".join(known)))
+      return names
+
+   def run(self, progress=None):
+      results = []
+      for size in self.sizes:
+         for family in self.families:
+            data = FAMILIES[family](size, Random(self.options["seed"]))
+            if self.options["floats"]: data = [float(x) for x in data]
+            expected = {"native": sorted(data), "key": sorted(data, key=_negated)}
+            expected["cmp"] = expected["native"]
+            for sorter in self.sorters:
+               for mode in self.modes:
+                  seconds = math.inf
+                  for k in range(0, max(1, self.options["repeat"])):
+                     copy = list(data)
+                     start = perf_counter()
+                     result = SORTERS[sorter](copy, mode)
+                     seconds = min(seconds, perf_counter() - start)
+                     if k == 0 and list(result) != expected[mode]:
+                        msg = "{0} in {1} mode got {2} of size {3} wrong"
+                        raise AssertionError(msg.format(sorter, mode, family, size))
+                  entry = dict(sorter=sorter, mode=mode, family=family, size=size,
+                     seconds=seconds)
+                  results.append(entry)
+                  if progress is not None: progress(entry)
+      meta = dict(options=self.options, python=platform.python_version(),
+         machine=platform.platform(), processor=platform.processor(),
+         date=strftime("%Y-%m-%d %H:%M:%S"))
+      return dict(meta=meta, results=results)
+
+   def compare(baseline, current, tolerance):
+      def entryKey(entry):
+         return (entry["sorter"], entry["mode"], entry["family"], entry["size"])
+      before = {entryKey(entry): entry["seconds"] for entry in baseline["results"]}
+      regressions = []
+      for entry in current["results"]:
+         old = before.get(entryKey(entry))
+         if old is not None and entry["seconds"] > old*(1 + tolerance):
+            regressions.append(dict(entry, baseline=old,
+               ratio=entry["seconds"]/old if old > 0 else math.inf))
+      return regressions
+
+
+   def setCmdLineArgs(parser):
+      DEFAULTS = SortBench.getOptionDefaults()
+      parser.add_a_str("-sizes", DEFAULTS["sizes"], "comma-separated sizes, e.g. 1e3,1e4")
+      parser.add_a_str("-families", DEFAULTS["families"], "comma-separated input families")
+      parser.add_a_str("-sorters", DEFAULTS["sorters"], "comma-separated sorters")
+      parser.add_a_str("-modes", DEFAULTS["modes"], "comma-separated modes: native, cmp, key")
+      parser.add_an_int("-repeat", DEFAULTS["repeat"], "runs per combination; the best counts")
+      parser.add_an_int("-seed", DEFAULTS["seed"], "seed for the random inputs")
+      parser.add_a_flag("-floats", "sort floats rather than ints")
+      parser.add_a_str("-out", DEFAULTS["out"], "path for the JSON results")
+      parser.add_a_str("-compare", DEFAULTS["compare"], "path of JSON results to compare against")
+      parser.add_a_float("-tolerance", DEFAULTS["tolerance"],
+         "fraction a time may grow before it is a regression")
+
+   def fromCmdLine(args=None):
+      USAGE = """\
+Time Quicksort, building a SortedList, and sorted on a range of input families, sizes and
+modes, optionally save the results as JSON, and optionally compare them with an earlier run.
+      """
+      options = clp.args_dict(clp.parse_args(SortBench, args=args, usage=USAGE))
+      bench = SortBench(options)
+      line = "{sorter:>10s} {mode:>6s} {family:>10s} {size:>9d} {seconds:10.4f}"
+      results = bench.run(progress=lambda entry: print(line.format(**entry), flush=True))
+      if options["out"]:
+         with open(options["out"], "w") as out:
+            json.dump(results, out, indent=1)
+      if options["compare"]:
+         with open(options["compare"]) as baselineFile:
+            baseline = json.load(baselineFile)
+         regressions = SortBench.compare(baseline, results, options["tolerance"])
+         for entry in regressions:
+            print(("REGRESSION: " + line + " was {baseline:.4f} ({ratio:.2f}x)").format(**entry))
+         if regressions:
+            print("{0} regression(s) beyond {1:.0%}".format(len(regressions),
+               options["tolerance"]))
+            return 1
+         print("no regressions beyond {0:.0%}".format(options["tolerance"]))
+      return 0
+
+if __name__ == '__main__':
+
+   sys.exit(SortBench.fromCmdLine())
@@ -1,8 +1,25 @@
 
+from array import array
 from blist import *
+from collections import deque
+import heapq
 from idbg import DbgClient
+import mmap
+from multiprocessing import Lock
+from multiprocessing.shared_memory import SharedMemory
+import os
+import pickle
+import shutil
+import struct
 import sys
 import sysutils as su
+import tempfile
+from time import perf_counter
+import weakref
+try:
+   import numpy as np
+except ImportError: # only typed_vblist's dtype argument uses it
+   np = None
 
 
 class BufferSizeError(Exception):
@@ -41,8 +58,110 @@ class _sizelimitProperty(object):
             msg = "You cannot increase the size limit {} to {}"
             self.raise_error(ValueError(msg.format(before, val)))
 
+class _opCounters(object):
+   """ the tallies kept by a vetted collection that has called start_counting() """
+   def __init__(self):
+      self.adds = 0          # entries added
+      self.overflows = 0     # adds refused because the collection was full
+      self.vet_calls = 0
+      self.vet_failures = 0  # vet calls that raised an exception
+      self.vet_seconds = 0.0 # total time spent in vet calls
+      self.drains = 0        # calls to next() that removed something
+      self.drained = 0       # entries removed by those calls
+      self.high_water = 0    # the largest size seen after an add
+      self.busy = False      # True while a counted method is running
+
+   def added(self, count, size):
+      self.adds += count
+      if size > self.high_water: self.high_water = size
+
+   def drained_by(self, count):
+      self.drains += 1
+      self.drained += count
+
+   def vet(self, vetter, what):
+      self.vet_calls += 1
+      start = perf_counter()
+      try:
+         return vetter(what)
+      except Exception:
+         self.vet_failures += 1
+         raise
+      finally:
+         self.vet_seconds += perf_counter() - start
+
+   def snapshot(self):
+      tally = dict(vars(self))
+      del tally["busy"]
+      return tally
+
+class _countingVet(object):
+   """ what "vet" returns for an instance that is counting: the real vetter, with a tally """
+   def __init__(self, vet, counters):
+      self.vet = vet
+      self.counters = counters
+   def __call__(self, what):
+      return self.counters.vet(self.vet, what)
+   def __eq__(self, other):
+      return self.vet == (other.vet if isinstance(other, _countingVet) else other)
+   def __ne__(self, other):
+      return not self.__eq__(other)
+   def __hash__(self):
+      return hash(self.vet)
+
+class _vetProperty(object):
+   """ replaces the instances' "vet" attribute while the class has counting instances """
+   def __get__(self, obj, cls):
+      if obj is None: return self
+      vet = obj.__dict__["vet"]
+      return vet if obj._counters is None else _countingVet(vet, obj._counters)
+   def __set__(self, obj, vet):
+      obj.__dict__["vet"] = vet.vet if isinstance(vet, _countingVet) else vet
+
+_COUNTED_ADDS = ("add", "add_all", "add_first", "insert", "update")
+_COUNTED_DRAINS = ("next", "next_or_else")
+
+def _counting_method(plain, drains):
+   # wraps "plain" so that an instance that is counting tallies the change in its size.  The
+   # "busy" flag keeps a method called from another counted method from counting twice.
+   def counted(self, *args, **kwargs):
+      counters = self._counters
+      if counters is None or counters.busy:
+         return plain(self, *args, **kwargs)
+      counters.busy = True
+      before = self.size
+      try:
+         return plain(self, *args, **kwargs)
+      finally:
+         counters.busy = False
+         after = self.size
+         if drains:
+            if after < before: counters.drained_by(before - after)
+         elif after > before:
+            counters.added(after - before, after)
+   return counted
+
+def _swap_counting(cls, on):
+   # the first instance of cls to start counting swaps the counting methods in on the class,
+   # and the last to stop swaps the originals back
+   counting = cls.__dict__.get("_countingInstances", 0) + (1 if on else -1)
+   cls._countingInstances = counting
+   if on and counting == 1:
+      cls._uncounted = {name: cls.__dict__.get(name) for name in ("vet",) +
+         _COUNTED_ADDS + _COUNTED_DRAINS if name == "vet" or hasattr(cls, name)}
+      for name in cls._uncounted:
+         if name == "vet": cls.vet = _vetProperty()
+         else: setattr(cls, name, _counting_method(getattr(cls, name), name in _COUNTED_DRAINS))
+   elif not on and counting == 0:
+      for name, original in cls._uncounted.items():
+         if original is None: delattr(cls, name)
+         else: setattr(cls, name, original)
+      del cls._uncounted
+
 
 class _sharedMethods:
+   _counters = None # an _opCounters, but only while counting
+
    def __add__(self, other):
       return self.__class__(self, vet=self.vet).add_all(other)
 
@@ -88,6 +207,8 @@ class _sharedMethods:
       return self.__class__.__name__+tail
 
    def handle_overflow(self, dieOnFail):
+      counters = getattr(self, "_counters", None)
+      if counters is not None: counters.overflows += 1
       if dieOnFail:
          self.raise_error(BufferSizeError(self))
       else:
@@ -102,16 +223,22 @@ class _sharedMethods:
          if hasattr(self, "extend"):
             super().extend(an_iterable) # for collections where "add" means "add at end"
          else:
-            for item in an_iterable: self.add(item)
+            for item in an_iterable: self._add_vetted(item, dieOnFail)
       else:
          for item in an_iterable:
-            if not self.add(item, dieOnFail=dieOnFail): # fail on overflow?
+            if not self._add_vetted(item, dieOnFail): # fail on overflow?
                break
       return self
 
    def copy(self):
       return self.__copy__()
 
+   def counters(self):
+      return None if self._counters is None else self._counters.snapshot()
+
+   def dbg_write_counters(self, key=None):
+      return self.dbg_write("counters: {}".format(self.counters()), key=key)
+
    def find(self, what):
       try:
          return self.index(what)
@@ -132,7 +259,8 @@ class _sharedMethods:
    @staticmethod
    def isAVettedCollection(stuff):
       return isinstance(stuff, vblist) or isinstance(stuff, vbdeque) or \
-            isinstance(stuff, vsortedlist) or isinstance(stuff, vsortedset)
+            isinstance(stuff, vsortedlist) or isinstance(stuff, vsortedset) or \
+            isinstance(stuff, typed_vblist)
 
    def peek(self, howMany = None, *, orElse = None, reverse=True):
       if howMany is None:
@@ -149,6 +277,17 @@ class _sharedMethods:
          leftToAdd = howMany - available
          return values if leftToAdd is 0 else values + ([orElse]*leftToAdd)
 
+   def start_counting(self):
+      if self._counters is None: _swap_counting(self.__class__, True)
+      self._counters = _opCounters()
+
+   def stop_counting(self):
+      final = self.counters()
+      if self._counters is not None:
+         self._counters = None
+         _swap_counting(self.__class__, False)
+      return final
+
    def tail(self, howMany = None):
       if howMany is None: # return the entry, not a list!! 
          return self[-1]
@@ -217,6 +356,13 @@ class vblist(_sharedMethods, blist, DbgClient):
             self.insert(next_in, entry)
             next_in += 1
 
+   def _add_vetted(self, what, dieOnFail):
+      if self.size < self.maxsize:
+         super().append(what)
+         return True
+      else:
+         return self.handle_overflow(dieOnFail)
+
    def add(self, what, *, dieOnFail=True):
       what = self.vet(what)
       if self.size < self.maxsize:
@@ -272,16 +418,17 @@ class vblist(_sharedMethods, blist, DbgClient):
             msg = "Request for next from an empty "+self.__class__.__name__
             self.raise_error(IndexError(msg))
       elif howMany > 0 and howMany <= self.size:
-         answer = self[0:howMany]
-         del self[0:howMany]
+         # the head and tail are always fair game, so skip the subclasses' __delitem__ checks
+         answer = blist.__getitem__(self, slice(0, howMany))
+         blist.__delitem__(self, slice(0, howMany))
          return answer
       elif howMany < 0 and (-howMany) <= self.size:
-         answer = self[-howMany:]
-         del self[-howMany:]
+         answer = blist.__getitem__(self, slice(howMany, None))
+         blist.__delitem__(self, slice(howMany, None))
          return answer
       else:
          msg = "{0} entries requested, only {1} available"
-         self.raise_error(IndexError(msg.format(abs(howMany), self._count_)))
+         self.raise_error(IndexError(msg.format(abs(howMany), self.size)))
 
    def next_or_else(self, howMany=None, orElse=None):
       if howMany is None:
@@ -291,10 +438,10 @@ class vblist(_sharedMethods, blist, DbgClient):
             return orElse
       elif abs(howMany) <= self.size:
          return self.next(howMany)
-      else:
-         fromList = self.next(howMany=self.size)
-         need = abs(howMany) - self.size
-         return fromList + ([orElse]*need)
+      else: # take what there is, from the end howMany asks for, and pad
+         available = self.size if howMany > 0 else -self.size
+         fromList = self.next(available) if available != 0 else []
+         return fromList + ([orElse]*(abs(howMany) - abs(available)))
 
    def prepend(self, iterable):
       added = list(iterable)
@@ -359,9 +506,9 @@ class vbdeque(vblist):
       else:
          self.raise_error(TypeError("Illegal type for 'index': {}".format(type(index))))
       if the_range.start == 0 or the_range.stop == self.size:
-         for n in range(0, len(the_range)): blist.__delitem__(self, the_range.start)
+         blist.__delitem__(self, slice(the_range.start, the_range.start+len(the_range)))
       else:
-         self.forbid("Deletion from the middle of a {} is not supported")
+         self._forbid("Deletion from the middle of a {} is not supported")
 
 
 class vbqueue(vbdeque):
@@ -390,10 +537,9 @@ class vbqueue(vbdeque):
       else:
          self.raise_error(TypeError("Illegal type for 'index': {}".format(type(index))))
       if the_range.start == 0:
-         for n in range(0, len(the_range)): blist.__delitem__(self, the_range.start)
+         blist.__delitem__(self, slice(0, len(the_range)))
       else:
-         msg = "Deletion from the middle of {} is not supported"
-         self.forbid(msg.format(su.a_classname(self)))
+         self._forbid("Deletion from the middle of a {} is not supported")
 
    def next_or_else(self, howMany=None, orElse=None):
       if howMany is None or howMany >= 0:
@@ -436,18 +582,21 @@ class vbstack(vbdeque):
       else:
          self.raise_error(TypeError("Illegal type for 'index': {}".format(type(index))))
       if the_range.stop == self.size:
-         for n in range(0, len(the_range)): blist.__delitem__(self, the_range.start)
+         blist.__delitem__(self, slice(the_range.start, the_range.start+len(the_range)))
       else:
-         msg = "Only deletion from the top of {} is supported"
-         self.forbid(msg.format(su.a_classname(self)))
+         self._forbid("Only deletion from the top of a {} is supported")
 
    def next_or_else(self, howMany=None, orElse=None):
       if howMany is None:
          return super().next_or_else(orElse=orElse, howMany=None)
-      if howMany >= 0:
-         return vblist.next_or_else(self, orElse=orElse, howMany=-howMany)
-      else:
+      elif howMany < 0:
          self.raise_error(ValueError("Illegal 'next' count, {}".format(howMany)))
+      # vblist.next_or_else would come back through our next, which takes no negative counts
+      elif howMany <= self.size:
+         return vblist.next(self, -howMany) if howMany > 0 else []
+      else:
+         fromList = vblist.next(self, -self.size) if self.size > 0 else []
+         return fromList + ([orElse]*(howMany - len(fromList)))
 
    def next(self, howMany=None):
       if howMany is None:
@@ -479,6 +628,13 @@ class vsortedlist(_sharedMethods, sortedlist, DbgClient):
    def __setitem__(self, index, value):
       self._forbid("{} indexing is only for read access")
 
+   def _add_vetted(self, what, dieOnFail):
+      if self.size < self.maxsize:
+         super().add(what)
+         return True
+      else:
+         return self.handle_overflow(dieOnFail)
+
    def add(self, what, *, dieOnFail=True):
       what = self.vet(what)
       if self.size < self.maxsize:
@@ -495,7 +651,7 @@ class vsortedlist(_sharedMethods, sortedlist, DbgClient):
          an_iterable = [self.vet(item) for item in an_iterable]
       if self.maxsize == sys.maxsize or self.size+len(an_iterable) <= self.maxsize:
          for item in an_iterable:
-            if not self.add(item, dieOnFail=dieOnFail):
+            if not self._add_vetted(item, dieOnFail):
                break
       else:
          self.handle_overflow(dieOnFail)
@@ -538,6 +694,13 @@ class vsortedset(_sharedMethods, sortedset, DbgClient):
    def __ixor__(self, other):
       return self.symmetric_difference_update(other)
 
+   def _add_vetted(self, what, dieOnFail):
+      if self.size < self.maxsize:
+         super().add(what)
+         return True
+      else:
+         return self.handle_overflow(dieOnFail)
+
    def add(self, what, *, dieOnFail=True):
       what = self.vet(what)
       if self.size < self.maxsize:
@@ -547,8 +710,10 @@ class vsortedset(_sharedMethods, sortedset, DbgClient):
          return self.handle_overflow(dieOnFail)
 
    def add_all(self, an_iterable,  *, dieOnFail=True):
+      if not _sharedMethods.isAVettedCollection(an_iterable) or (self.vet != an_iterable.vet):
+         an_iterable = (self.vet(item) for item in an_iterable)
       for item in an_iterable:
-         if not self.add(item, dieOnFail=dieOnFail): # fail on overflow?
+         if not self._add_vetted(item, dieOnFail): # fail on overflow?
             break
       return self
 
@@ -589,3 +754,651 @@ class vsortedset(_sharedMethods, sortedset, DbgClient):
 
    def update(self, an_iterable):
       return self.add_all(an_iterable, dieOnFail=True) 
+
+
+_TYPECODES = {float: 'd', int: 'q'}
+_NUMERIC_CODES = frozenset("bBhHiIlLqQfd")
+
+def _typecode(dtype):
+   """ the array type code for a typed_vblist dtype, or None if there is none """
+   if isinstance(dtype, type) and dtype in _TYPECODES:
+      return _TYPECODES[dtype]
+   if np is not None:
+      try:
+         typecode = np.dtype(dtype).char
+      except TypeError:
+         return None
+   else:
+      typecode = getattr(dtype, "char", dtype)
+   return typecode if typecode in _NUMERIC_CODES else None
+
+def _asis(data):
+   return data
+
+class typed_vblist(_sharedMethods, DbgClient):
+   size    = _sizeProperty()
+   maxsize = _sizelimitProperty()
+   def __init__(self, iterable=[], maxsize=sys.maxsize, vet=None, dtype='d', capacity=16):
+      DbgClient.__init__(self)
+      typecode = _typecode(dtype)
+      if typecode is None:
+         msg = "expected a numeric array type code, float or int, not {}"
+         self.raise_error(ValueError(msg.format(dtype)))
+      self.typecode = typecode
+      self._capacity = max(int(capacity), 1)
+      self._store = array(typecode, bytes(self._capacity*array(typecode).itemsize))
+      self._first = 0 # index in _store of the head of the list
+      self._stop = 0  # index in _store just after the tail of the list
+      self.maxsize = maxsize
+      self.vet = _asis
+      self.add_all(iterable)
+      if vet is not None:
+         self.vet = vet
+         for n in range(self._first, self._stop):
+            self._store[n] = vet(self._store[n])
+
+   def __copy__(self):
+      newlist = self.__class__(self, maxsize=self.maxsize, dtype=self.typecode)
+      newlist.vet = self.vet
+      return newlist
+
+   def __eq__(self, other):
+      return isinstance(other, self.__class__) and \
+         self.typecode == other.typecode and \
+         self.vet == other.vet and \
+         self.maxsize == other.maxsize and \
+         self._live() == other._live()
+
+   def __getitem__(self, which):
+      count = self._stop - self._first
+      if isinstance(which, slice):
+         start, stop, step = which.indices(count)
+         if step > 0:
+            return self._store[self._first+start : self._first+max(start, stop) : step]
+         return self._live()[which]
+      if which < 0:
+         which += count
+      if which < 0 or which >= count:
+         msg = "index {0} is not in range(-{1},{1}), as required."
+         self.raise_error(IndexError(msg.format(which, count)))
+      return self._store[self._first+which]
+
+   def __iter__(self):
+      return iter(self.view())
+
+   def __len__(self):
+      return self._stop - self._first
+
+   def __repr__(self):
+      return "{}('{}', {})".format(self.__class__.__name__, self.typecode, self._live().tolist())
+
+   def __setitem__(self, index, value):
+      self.raise_error(su.IllegalOpError("typed_vblist indexing is only for read access"))
+
+   def _live(self):
+      return self._store[self._first:self._stop]
+
+   def _reserve(self, extra):
+      if self._stop + extra <= len(self._store):
+         return
+      count = self._stop - self._first
+      capacity = len(self._store)
+      while capacity < count + extra:
+         capacity *= 2
+      # build a new store, rather than resizing the old one, so that outstanding views stay valid
+      store = self._live()
+      store.frombytes(bytes((capacity - count)*store.itemsize))
+      self._store = store
+      self._first = 0
+      self._stop = count
+
+   def _take(self, first, stop):
+      taken = self._store[first:stop]
+      if first == self._first:
+         self._first = stop
+      else:
+         self._stop = first
+      if self._first == self._stop: # empty: start over at the bottom of the store
+         self._first = self._stop = 0
+      return taken
+
+   def add(self, what, *, dieOnFail=True):
+      what = self.vet(what)
+      if self._stop - self._first < self.maxsize:
+         if self._stop == len(self._store):
+            self._reserve(1)
+         self._store[self._stop] = what
+         self._stop += 1
+         return True
+      else:
+         return self.handle_overflow(dieOnFail)
+
+   def add_all(self, an_iterable, *, dieOnFail=True):
+      if isinstance(an_iterable, typed_vblist) and an_iterable.typecode == self.typecode \
+            and an_iterable.vet == self.vet:
+         incoming = an_iterable._live()
+      elif self.vet is _asis:
+         incoming = array(self.typecode, an_iterable)
+      else:
+         incoming = array(self.typecode, [self.vet(item) for item in an_iterable])
+      count = len(incoming)
+      if self._stop - self._first + count <= self.maxsize:
+         self._reserve(count)
+         self._store[self._stop : self._stop+count] = incoming
+         self._stop += count
+      else:
+         self.handle_overflow(dieOnFail)
+      return self
+
+   def extend(self, iterable, dieOnFail=True):
+      return self.add_all(iterable, dieOnFail=dieOnFail)
+
+   def find(self, what):
+      try:
+         return self._live().index(what)
+      except ValueError:
+         return -1
+
+   def next(self, howMany=None):
+      count = self._stop - self._first
+      if howMany is None:
+         if count > 0:
+            return self._take(self._first, self._first+1)[0]
+         else:
+            msg = "Request for next from an empty "+self.__class__.__name__
+            self.raise_error(IndexError(msg))
+      elif howMany > 0 and howMany <= count:
+         return self._take(self._first, self._first+howMany)
+      elif howMany < 0 and (-howMany) <= count:
+         return self._take(self._stop+howMany, self._stop)
+      else:
+         msg = "{0} entries requested, only {1} available"
+         self.raise_error(IndexError(msg.format(abs(howMany), count)))
+
+   def next_or_else(self, howMany=None, orElse=None):
+      if howMany is None:
+         return orElse if self.size == 0 else self.next()
+      elif abs(howMany) <= self.size:
+         return self.next(howMany)
+      else:
+         need = abs(howMany) - self.size
+         available = self.size if howMany > 0 else -self.size
+         fromList = self.next(available) if available != 0 else array(self.typecode)
+         return fromList + self._padding(orElse, need)
+
+   def peek(self, howMany = None, *, orElse = None, reverse=True):
+      if howMany is None:
+         return orElse if self.size == 0 else self._store[self._first]
+      if howMany > 0:
+         available = min(self.size, howMany)
+         values = self._store[self._first : self._first+available]
+      else:
+         howMany = -howMany
+         available = min(self.size, howMany)
+         values = self._store[self._stop-available : self._stop]
+         if reverse: values.reverse()
+      leftToAdd = howMany - available
+      return values if leftToAdd == 0 else values + self._padding(orElse, leftToAdd)
+
+   def _padding(self, orElse, count):
+      try:
+         return array(self.typecode, [orElse]*count)
+      except TypeError:
+         msg = "cannot pad a '{}' array with {!r}: pass an orElse the array accepts"
+         self.raise_error(TypeError(msg.format(self.typecode, orElse)))
+
+   def view(self):
+      return memoryview(self._store)[self._first:self._stop]
+
+typed_vblist.configure_debugging("vblist")
+
+
+def _remove_spill(segments, scratchdir, ownsdir):
+   """ deletes a SpillingVbQueue's segment files, and its scratch directory if it made it """
+   for path, count, nbytes in segments:
+      if os.path.exists(path):
+         os.remove(path)
+   segments.clear()
+   if ownsdir and os.path.isdir(scratchdir):
+      shutil.rmtree(scratchdir, ignore_errors=True)
+
+class SpillingVbQueue(DbgClient):
+   maxsize = _sizelimitProperty()
+   def __init__(self, iterable=[], maxsize=sys.maxsize, vet=None, *,
+         inmemory=64*1024, segsize=None, scratchdir=None
+   ):
+      DbgClient.__init__(self)
+      self.maxsize = maxsize
+      self.vet = _asis if vet is None else vet
+      self.inmemory = max(int(inmemory), 1)
+      self.segsize = max(int(segsize or self.inmemory//4), 1)
+      self._ownsdir = scratchdir is None
+      self._scratchdir = tempfile.mkdtemp(prefix="vbspill") if self._ownsdir else scratchdir
+      self._head = blist()
+      self._tail = blist()
+      self._segments = deque() # (path, count, nbytes) for each spilled segment, oldest first
+      self._segcount = 0       # used to name the segment files
+      self._spilled_items = 0
+      self._spilled_bytes = 0
+      self._inmemory_bytes = 0
+      # the files go even if close() is never called: the finalizer must not refer to self
+      self._cleanup = weakref.finalize(
+         self, _remove_spill, self._segments, self._scratchdir, self._ownsdir
+      )
+      self.add_all(iterable)
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, exc_type, exc_value, exc_tb):
+      self.close()
+
+   def __len__(self):
+      return len(self._head) + self._spilled_items + len(self._tail)
+
+   @property
+   def size(self):
+      return len(self)
+
+   def _spill(self):
+      while len(self._head) + len(self._tail) > self.inmemory and len(self._tail) > 0:
+         count = min(self.segsize, len(self._tail))
+         items = list(self._tail[0:count])
+         del self._tail[0:count]
+         path = os.path.join(self._scratchdir, "seg{:08d}.pkl".format(self._segcount))
+         self._segcount += 1
+         with open(path, "wb") as f:
+            pickle.dump(items, f, protocol=pickle.HIGHEST_PROTOCOL)
+         nbytes = os.path.getsize(path)
+         self._segments.append((path, count, nbytes))
+         self._spilled_items += count
+         self._spilled_bytes += nbytes
+         self._inmemory_bytes -= sum(sys.getsizeof(item) for item in items)
+         self.dbg_write("spilled {} entries ({} bytes) to {}".format(count, nbytes, path))
+
+   def _refill(self):
+      if len(self._head) > 0:
+         return
+      if len(self._segments) > 0:
+         path, count, nbytes = self._segments.popleft()
+         with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+               self._head = blist(pickle.loads(mapped))
+         os.remove(path)
+         self._spilled_items -= count
+         self._spilled_bytes -= nbytes
+         self._inmemory_bytes += sum(sys.getsizeof(item) for item in self._head)
+      else:
+         self._head, self._tail = self._tail, self._head
+
+   def _removed(self, items):
+      self._inmemory_bytes -= sum(sys.getsizeof(item) for item in items)
+
+   def handle_overflow(self, dieOnFail):
+      return _sharedMethods.handle_overflow(self, dieOnFail)
+
+   def add(self, what, *, dieOnFail=True):
+      what = self.vet(what)
+      if self.size < self.maxsize:
+         self._tail.append(what)
+         self._inmemory_bytes += sys.getsizeof(what)
+         if len(self._head) + len(self._tail) > self.inmemory:
+            self._spill()
+         return True
+      else:
+         return self.handle_overflow(dieOnFail)
+
+   def add_all(self, an_iterable, *, dieOnFail=True):
+      for item in an_iterable:
+         if not self.add(item, dieOnFail=dieOnFail): # fail on overflow?
+            break
+      return self
+
+   def close(self):
+      self._cleanup()
+      self._head = blist()
+      self._tail = blist()
+      self._spilled_items = self._spilled_bytes = self._inmemory_bytes = 0
+
+   def isEmpty(self):
+      return self.size == 0
+
+   def metrics(self):
+      return {
+         "size"           : self.size,
+         "inmemory_items" : len(self._head) + len(self._tail),
+         "inmemory_bytes" : self._inmemory_bytes,
+         "spilled_items"  : self._spilled_items,
+         "spilled_bytes"  : self._spilled_bytes,
+         "segments"       : len(self._segments)
+      }
+
+   def next(self, howMany=None):
+      if howMany is None:
+         if self.size == 0:
+            msg = "Request for next from an empty "+self.__class__.__name__
+            self.raise_error(IndexError(msg))
+         self._refill()
+         answer = self._head[0]
+         del self._head[0]
+         self._removed((answer,))
+         return answer
+      elif howMany < 0:
+         self.raise_error(ValueError("Illegal 'next' count, {}".format(howMany)))
+      elif howMany > self.size:
+         msg = "{0} entries requested, only {1} available"
+         self.raise_error(IndexError(msg.format(howMany, self.size)))
+      answer = blist()
+      while len(answer) < howMany:
+         self._refill()
+         count = min(howMany - len(answer), len(self._head))
+         taken = self._head[0:count]
+         del self._head[0:count]
+         self._removed(taken)
+         answer.extend(taken)
+      return answer
+
+   def next_or_else(self, howMany=None, orElse=None):
+      if howMany is None:
+         return orElse if self.size == 0 else self.next()
+      elif howMany <= self.size:
+         return self.next(howMany)
+      else:
+         need = howMany - self.size
+         return self.next(self.size) + ([orElse]*need)
+
+SpillingVbQueue.configure_debugging("vblist")
+
+
+_SHARED_HEADER = struct.Struct("<qqqqqq") # head, tail, count, used, maxsize, capacity
+_RECORD_LENGTH = struct.Struct("<I")
+
+class SharedVbQueue(DbgClient):
+   def __init__(self, name=None, capacity=1024*1024, maxsize=sys.maxsize, vet=None, *,
+         lock=None, create=True
+   ):
+      DbgClient.__init__(self)
+      self.vet = _asis if vet is None else vet
+      if create:
+         capacity = int(capacity)
+         self._shm = SharedMemory(name=name, create=True, size=_SHARED_HEADER.size+capacity)
+         self._lock = Lock() if lock is None else lock
+         self._setheader(0, 0, 0, 0, sys.maxsize if maxsize is None else int(maxsize), capacity)
+      else:
+         self._attach(name, lock)
+      self._creator = create
+
+   def _attach(self, name, lock):
+      if lock is None:
+         msg = "Attaching to the {} '{}' needs its creator's lock"
+         self.raise_error(ValueError(msg.format(self.__class__.__name__, name)))
+      # the processes sharing the block share their creator's resource tracker, which the
+      # creator's unlink settles, so there is nothing to unregister here
+      self._shm = SharedMemory(name=name)
+      self._lock = lock
+      self._creator = False
+
+   def __getstate__(self):
+      return {"name": self.name, "lock": self._lock, "vet": self.vet}
+
+   def __setstate__(self, state):
+      DbgClient.__init__(self) # none of its state is pickled
+      self.vet = state["vet"]
+      self._attach(state["name"], state["lock"])
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, exc_type, exc_value, exc_tb):
+      self.close()
+      if self._creator:
+         self.unlink()
+
+   def __len__(self):
+      return self._header()[2]
+
+   @property
+   def maxsize(self):
+      return self._header()[4]
+
+   @property
+   def name(self):
+      return self._shm.name
+
+   @property
+   def size(self):
+      return len(self)
+
+   def _header(self):
+      return _SHARED_HEADER.unpack_from(self._shm.buf, 0)
+
+   def _setheader(self, *values):
+      _SHARED_HEADER.pack_into(self._shm.buf, 0, *values)
+
+   def _read(self, offset, count, capacity):
+      start = _SHARED_HEADER.size + offset
+      first = min(count, capacity - offset)
+      data = bytes(self._shm.buf[start : start+first])
+      if first < count:
+         data += bytes(self._shm.buf[_SHARED_HEADER.size : _SHARED_HEADER.size+count-first])
+      return data
+
+   def _write(self, offset, data, capacity):
+      start = _SHARED_HEADER.size + offset
+      first = min(len(data), capacity - offset)
+      self._shm.buf[start : start+first] = data[0:first]
+      if first < len(data):
+         self._shm.buf[_SHARED_HEADER.size : _SHARED_HEADER.size+len(data)-first] = data[first:]
+
+   def _take(self, howMany):
+      head, tail, count, used, maxsize, capacity = self._header()
+      answer = []
+      for n in range(0, howMany):
+         length = _RECORD_LENGTH.unpack(self._read(head, _RECORD_LENGTH.size, capacity))[0]
+         head = (head + _RECORD_LENGTH.size) % capacity
+         answer.append(self._read(head, length, capacity))
+         head = (head + length) % capacity
+         used -= _RECORD_LENGTH.size + length
+      self._setheader(head, tail, count-howMany, used, maxsize, capacity)
+      return answer
+
+   def handle_overflow(self, dieOnFail):
+      return _sharedMethods.handle_overflow(self, dieOnFail)
+
+   def add(self, what, *, dieOnFail=True):
+      payload = memoryview(self.vet(what)).cast('B')
+      needed = _RECORD_LENGTH.size + len(payload)
+      with self._lock:
+         head, tail, count, used, maxsize, capacity = self._header()
+         fits = count < maxsize and used + needed <= capacity
+         if fits:
+            self._write(tail, _RECORD_LENGTH.pack(len(payload)), capacity)
+            self._write((tail + _RECORD_LENGTH.size) % capacity, payload, capacity)
+            tail = (tail + needed) % capacity
+            self._setheader(head, tail, count+1, used+needed, maxsize, capacity)
+      return True if fits else self.handle_overflow(dieOnFail)
+
+   def add_all(self, an_iterable, *, dieOnFail=True):
+      for item in an_iterable:
+         if not self.add(item, dieOnFail=dieOnFail): # fail on overflow?
+            break
+      return self
+
+   def close(self):
+      self._shm.close()
+
+   def isEmpty(self):
+      return self.size == 0
+
+   def next(self, howMany=None):
+      if howMany is not None and howMany < 0:
+         self.raise_error(ValueError("Illegal 'next' count, {}".format(howMany)))
+      with self._lock:
+         available = self._header()[2]
+         if available >= (1 if howMany is None else howMany):
+            answer = self._take(1 if howMany is None else howMany)
+            return answer[0] if howMany is None else answer
+      if howMany is None:
+         msg = "Request for next from an empty "+self.__class__.__name__
+         self.raise_error(IndexError(msg))
+      msg = "{0} entries requested, only {1} available"
+      self.raise_error(IndexError(msg.format(howMany, available)))
+
+   def next_or_else(self, howMany=None, orElse=None):
+      if howMany is not None and howMany < 0:
+         self.raise_error(ValueError("Illegal 'next' count, {}".format(howMany)))
+      with self._lock:
+         available = self._header()[2]
+         if howMany is None:
+            return self._take(1)[0] if available > 0 else orElse
+         answer = self._take(min(howMany, available))
+      return answer + [orElse]*(howMany - len(answer))
+
+   def unlink(self):
+      self._shm.unlink()
+
+SharedVbQueue.configure_debugging("vblist")
+
+
+class _Lowest(object):
+   """ orders a vbpriorityqueue entry backwards, so that heapq keeps the lowest priority on top """
+   __slots__ = ("entry",)
+   def __init__(self, entry):
+      self.entry = entry
+   def __lt__(self, other):
+      return other.entry < self.entry
+
+class vbpriorityqueue(DbgClient):
+   size    = _sizeProperty()
+   maxsize = _sizelimitProperty()
+   def __init__(self, iterable=[], maxsize=sys.maxsize, vet=None, evict=True):
+      DbgClient.__init__(self)
+      # each entry, [item, serial number, live?], is in both heaps; one removed from either is
+      # marked dead, and left in the other until it surfaces there
+      self._heap = []
+      self._lowest = []
+      self._count = 0
+      self._serial = 0
+      self.maxsize = maxsize
+      self.vet = _asis if vet is None else vet
+      self.evict = evict
+      self.evictions = 0
+      self.add_all(iterable)
+
+   def _entries(self):
+      return (entry for entry in self._heap if entry[2])
+
+   def __iter__(self):
+      return iter(sorted(entry[0] for entry in self._entries()))
+
+   def __len__(self):
+      return self._count
+
+   def __repr__(self):
+      return "{}({})".format(self.__class__.__name__, list(self))
+
+   def _insert(self, what):
+      entry = [what, self._serial, True]
+      self._serial += 1
+      heapq.heappush(self._heap, entry)
+      heapq.heappush(self._lowest, _Lowest(entry))
+      self._count += 1
+
+   def _best(self):
+      heap = self._heap
+      while not heap[0][2]: heapq.heappop(heap)
+      return heap[0]
+
+   def _worst(self):
+      lowest = self._lowest
+      while not lowest[0].entry[2]: heapq.heappop(lowest)
+      return lowest[0].entry
+
+   def _remove(self, entry):
+      entry[2] = False
+      self._count -= 1
+      if len(self._heap) + len(self._lowest) > 4*self._count + 64: # mostly dead: rebuild
+         self._heap = list(self._entries())
+         heapq.heapify(self._heap)
+         self._lowest = [_Lowest(entry) for entry in self._heap]
+         heapq.heapify(self._lowest)
+      return entry[0]
+
+   def _pop(self):
+      self._best()
+      return self._remove(heapq.heappop(self._heap))
+
+   def _evict_for(self, what):
+      worst = self._worst() if self._count > 0 else None
+      if worst is None or not what < worst[0]:
+         evicted = what
+      else:
+         heapq.heappop(self._lowest)
+         evicted = self._remove(worst)
+         self._insert(what)
+      self.evictions += 1
+      self.dbg_write("evicted {} from a full {}".format(evicted, self.__class__.__name__))
+      return evicted is not what
+
+   def handle_overflow(self, dieOnFail):
+      return _sharedMethods.handle_overflow(self, dieOnFail)
+
+   def add(self, what, *, dieOnFail=True):
+      return self.push(what, dieOnFail=dieOnFail)
+
+   def add_all(self, an_iterable, *, dieOnFail=True):
+      for item in an_iterable:
+         if not self.push(item, dieOnFail=dieOnFail) and not self.evict:
+            break
+      return self
+
+   def isEmpty(self):
+      return self._count == 0
+
+   def next(self, howMany=None):
+      if howMany is None:
+         if self._count > 0:
+            return self._pop()
+         msg = "Request for next from an empty "+self.__class__.__name__
+         self.raise_error(IndexError(msg))
+      elif howMany < 0:
+         self.raise_error(ValueError("Illegal 'next' count, {}".format(howMany)))
+      elif howMany > self._count:
+         msg = "{0} entries requested, only {1} available"
+         self.raise_error(IndexError(msg.format(howMany, self._count)))
+      return [self._pop() for n in range(0, howMany)]
+
+   def next_or_else(self, howMany=None, orElse=None):
+      if howMany is None:
+         return self._pop() if self._count > 0 else orElse
+      available = min(howMany, self._count)
+      return self.next(available) + [orElse]*(howMany - available)
+
+   def peek(self, howMany=None, *, orElse=None):
+      if howMany is None:
+         return self._best()[0] if self._count > 0 else orElse
+      values = [entry[0] for entry in heapq.nsmallest(howMany, self._entries())]
+      return values + [orElse]*(howMany - len(values))
+
+   def pop(self, howMany=None):
+      return self.next(howMany)
+
+   def push(self, what, *, dieOnFail=True):
+      what = self.vet(what)
+      if self._count < self.maxsize:
+         self._insert(what)
+         return True
+      elif self.evict:
+         return self._evict_for(what)
+      else:
+         return self.handle_overflow(dieOnFail)
+
+   def pushpop(self, what):
+      what = self.vet(what)
+      if self._count == 0 or not self._best()[0] < what:
+         return what
+      best = self._pop()
+      self._insert(what)
+      return best
+
+vbpriorityqueue.configure_debugging("vblist")